@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+# no display needed, plots are only written to the render cache
+matplotlib.use('Agg')
+
+from codersmuse import config, RenderCache, SessionCache
+from codersmuse.CohortSession import find_participants
+
+MARKER_DIRECTORY = 'batch'
+
+
+def batch_key(source_files):
+    # everything the cached results of a participant depend on
+    key = hashlib.sha1()
+    key.update(SessionCache.session_key(*source_files[:3]).encode())
+    for source_file in source_files[3:]:
+        key.update((SessionCache.file_fingerprint(source_file) if os.path.exists(source_file) else 'missing').encode())
+    for setting in (RenderCache.RENDER_FORMAT_VERSION, config.PLUGIN_PHYSIO_ACTIVE, config.PLUGIN_FMRI_ACTIVE, config.PHYSIO_PLOT_MODE, config.FMRI_FULLBRAIN_MODE,
+                    config.FMRI_CUT_SLICE_X, config.FMRI_CUT_SLICE_Y, config.FMRI_CUT_SLICE_Z,
+                    config.FMRI_ROI_ATLAS, sorted(config.FMRI_ROI_MASKS.items()), config.FMRI_ROI_PLOTS):
+        key.update(str(setting).encode())
+
+    return key.hexdigest()
+
+
+def marker_path(participant):
+    return os.path.join(config.CACHE_DIRECTORY, MARKER_DIRECTORY, participant + '.json')
+
+
+def load_marker(participant):
+    if not os.path.exists(marker_path(participant)):
+        return None
+
+    with open(marker_path(participant), 'r') as marker_file:
+        return json.load(marker_file)
+
+
+def store_marker(participant, result):
+    os.makedirs(os.path.dirname(marker_path(participant)), exist_ok=True)
+    with open(marker_path(participant) + '.tmp', 'w') as marker_file:
+        json.dump(result, marker_file)
+    os.replace(marker_path(participant) + '.tmp', marker_path(participant))
+
+
+def precompute_participant(participant, source_files, settings, force=False):
+    # runs in its own process: ingestion, cleaning, behavioral summary and all plot rendering of one participant
+    for name, value in settings.items():
+        setattr(config, name, value)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s ' + participant + ' %(message)s')
+
+    # the session loader reports the start of every stage, which gives a timing per stage
+    stages = {}
+    started = time.perf_counter()
+
+    try:
+        key = batch_key(source_files)
+    except Exception as error:
+        logging.exception('batch: %s failed', participant)
+        return failed_result(participant, error, started, stages)
+
+    marker = load_marker(participant)
+    if not force and marker is not None and marker['key'] == key:
+        return dict(marker, status='skipped', seconds=0.0, stages={})
+    stage = {'label': None, 'started': started}
+
+    def progress_callback(label):
+        now = time.perf_counter()
+        if stage['label'] is not None:
+            stages[stage['label']] = stages.get(stage['label'], 0) + now - stage['started']
+        stage['label'], stage['started'] = label, now
+        return None
+
+    from codersmuse import SessionLoader
+
+    try:
+        experiment_data = SessionLoader.load_session(*source_files, participant=participant, progress_callback=progress_callback)
+    except Exception as error:
+        logging.exception('batch: %s failed', participant)
+        return failed_result(participant, error, started, stages)
+
+    progress_callback(None)
+    result = {
+        'participant': participant,
+        'key': key,
+        'status': 'done',
+        'seconds': time.perf_counter() - started,
+        'stages': stages,
+        'plugins': experiment_data['plugins'],
+        'responses': {str(condition): {name: SessionCache.to_python(value) for name, value in response.items()}
+                      for condition, response in experiment_data['responses'].items()}
+    }
+    store_marker(participant, result)
+
+    return result
+
+
+def failed_result(participant, error, started, stages):
+    return {'participant': participant, 'status': 'failed', 'error': str(error), 'seconds': time.perf_counter() - started, 'stages': stages}
+
+
+def run_batch(directory, processes=None, force=False):
+    participants = find_participants(directory)
+    if not participants:
+        logging.warning('batch: no participants found in %s', directory)
+        return []
+
+    # participants run in parallel, the cores are split between them for rendering
+    processes = min(processes or os.cpu_count(), len(participants))
+    settings = {
+        'CACHE_DIRECTORY': config.CACHE_DIRECTORY,
+        'RENDER_CACHE_DIRECTORY': config.RENDER_CACHE_DIRECTORY,
+        'PHYSIO_PLOT_MODE': config.PHYSIO_PLOT_MODE,
+        'FMRI_FULLBRAIN_MODE': config.FMRI_FULLBRAIN_MODE,
+        'RENDER_PROCESSES': config.RENDER_PROCESSES or max(1, os.cpu_count() // processes)
+    }
+    logging.info('batch: %s participants, %s in parallel, %s render processes each', len(participants), processes, settings['RENDER_PROCESSES'])
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = {executor.submit(precompute_participant, participant, source_files, settings, force): participant for participant, source_files in participants.items()}
+        for future in as_completed(futures):
+            # a crashed worker process (e.g., out of memory) only fails its own participant
+            try:
+                result = future.result()
+            except Exception as error:
+                logging.error('batch: worker of %s crashed: %s', futures[future], error)
+                result = {'participant': futures[future], 'status': 'failed', 'error': str(error), 'seconds': 0.0, 'stages': {}}
+            logging.info('batch: %s %s after %.1f s', result['participant'], result['status'], result['seconds'])
+            results.append(result)
+
+    results.sort(key=lambda result: result['participant'])
+    return results
+
+
+def print_summary(results):
+    stage_labels = []
+    for result in results:
+        stage_labels.extend(label for label in result['stages'] if label not in stage_labels)
+
+    print('%-12s %-8s %8s  %s' % ('participant', 'status', 'total', '  '.join(label.rstrip(' .') for label in stage_labels)))
+    for result in results:
+        stages = '  '.join('%*.1f' % (len(label.rstrip(' .')), result['stages'][label]) if label in result['stages'] else ' ' * len(label.rstrip(' .'))
+                           for label in stage_labels)
+        print('%-12s %-8s %7.1fs  %s' % (result['participant'], result['status'], result['seconds'], stages))
+
+
+def write_behavioral_summary(results, output_file):
+    # one row per participant and condition
+    with open(output_file, 'w') as out_file:
+        out_file.write('Participant,Condition,ResponseTime,Response,Clicktime\n')
+        for result in results:
+            for condition, response in result.get('responses', {}).items():
+                out_file.write('%s,%s,%s,%s,%s\n' % (result['participant'], condition, *('' if response[name] is None else response[name] for name in ('time', 'answer', 'clicktime'))))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Pre-compute the session and render caches of all participants in a directory, without opening the GUI.')
+    parser.add_argument('directory', help='directory with <participant>_behavioral.csv, _eyetracking.csv, _physio.csv, _roi.csv and <participant>.nii files')
+    parser.add_argument('--processes', type=int, default=None, help='participants processed in parallel (default: number of cores)')
+    parser.add_argument('--cache-directory', default=None, help='cache directory (default: %s)' % os.path.normpath(config.CACHE_DIRECTORY))
+    parser.add_argument('--physio-plot-mode', choices=('live', 'images'), default=config.PHYSIO_PLOT_MODE, help='render physio plot images for the images mode')
+    parser.add_argument('--fmri-fullbrain-mode', choices=('slices', 'images'), default=config.FMRI_FULLBRAIN_MODE, help='render full-brain fMRI plot images for the images mode')
+    parser.add_argument('--force', action='store_true', help='process participants again, even if they were already completed')
+    parser.add_argument('--summary-file', default=None, help='write the behavioral summary of all participants to this csv file')
+    args = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.cache_directory is not None:
+        config.CACHE_DIRECTORY = os.path.abspath(args.cache_directory)
+        config.RENDER_CACHE_DIRECTORY = os.path.join(config.CACHE_DIRECTORY, 'render')
+    config.PHYSIO_PLOT_MODE = args.physio_plot_mode
+    config.FMRI_FULLBRAIN_MODE = args.fmri_fullbrain_mode
+
+    results = run_batch(args.directory, args.processes, args.force)
+    print_summary(results)
+
+    if args.summary_file is not None:
+        write_behavioral_summary(results, args.summary_file)
+
+    return 1 if any(result['status'] == 'failed' for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,8 @@
 #!/usr/bin/env python
+import time
+
+STARTUP_STARTED = time.perf_counter()
+
 import logging
 import os
 import sys
@@ -8,17 +12,12 @@ import matplotlib
 # Make sure that we are using QT5 for matplotlibs
 matplotlib.use('Qt5Agg')
 
-import pandas as pd
 from PySide2 import QtWidgets, QtCore
 from PySide2.QtGui import QIcon
-from PySide2.QtWidgets import (QAction, qApp, QApplication, QMainWindow, QMessageBox)
+from PySide2.QtWidgets import (QAction, qApp, QApplication, QMainWindow, QMessageBox, QProgressDialog)
 
-from codersmuse.plugins.behavioral import BehavioralView
-from codersmuse.plugins.eyetracking import EyeTrackingData
-from codersmuse.plugins.fmri import fMRIData
-from codersmuse.plugins.psychophysio import PsychoPhysiologicalData
 from codersmuse.DataExplorationView import DataView
-from codersmuse import config
+from codersmuse import config, CohortSession, SessionLoader
 
 OPEN_SAMPLE_DATA_ON_START = True
 
@@ -30,16 +29,15 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
 
+        self.experiment_data = None
+        self.cohort = None
+        self.session_loader = None
+        self.progress_dialog = None
+
         self.setup_menubar()
 
         if OPEN_SAMPLE_DATA_ON_START:
-            self.prepare_and_display_data(
-                behavioral_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_behavioral.csv'),
-                eyetracking_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_eyetracking.csv'),
-                physio_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_physio.csv'),
-                fmri_roi_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_roi.csv'),
-                fmri_nifti_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01.nii')
-            )
+            self.show_sample()
 
     def setup_menubar(self):
         experiment_menu = self.menuBar().addMenu("Experiment Data")
@@ -50,11 +48,17 @@ class MainWindow(QMainWindow):
                                  shortcut=QtCore.Qt.CTRL + QtCore.Qt.Key_O,
                                  triggered=self.select_open_file)
         experiment_menu.addAction(self.open_data)
+        self.open_cohort = QAction(brain_icon,
+                                   "Open Cohort",
+                                   self,
+                                   shortcut=QtCore.Qt.CTRL + QtCore.Qt.SHIFT + QtCore.Qt.Key_O,
+                                   triggered=self.select_open_cohort)
+        experiment_menu.addAction(self.open_cohort)
         self.show_sample_data = QAction(brain_icon,
                                         "Show Sample Data",
                                         self,
                                         shortcut=QtCore.Qt.CTRL + QtCore.Qt.Key_T,
-                                        triggered=self.prepare_and_display_data)
+                                        triggered=self.show_sample)
         experiment_menu.addAction(self.show_sample_data)
 
         settings_action = QAction("Settings", self, triggered=self.settings)
@@ -97,7 +101,30 @@ class MainWindow(QMainWindow):
             return
         self.check_file(fmri_nifti_file)
 
-        self.prepare_and_display_data(behavioral_data_file, eyetracking_data_file, physio_data_file, fmri_roi_file, fmri_nifti_file)
+        self.cohort = None
+        self.prepare_and_display_data(behavioral_data_file, eyetracking_data_file, physio_data_file, fmri_roi_file, fmri_nifti_file,
+                                      participant=CohortSession.participant_name(behavioral_data_file))
+
+    def select_open_cohort(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Open Cohort Directory", QtCore.QDir.currentPath())
+        if not directory:
+            return
+
+        cohort = CohortSession.CohortSession(directory)
+        if not cohort.participants:
+            QtWidgets.QMessageBox.warning(self, "Open Cohort", "No participants (*_behavioral.csv files) found in %s." % directory)
+            return
+
+        self.cohort = cohort
+        self.show_participant(cohort.participants[0])
+
+    def show_participant(self, participant):
+        # resident participants are shown right away, all others are loaded (usually from the session cache)
+        experiment_data = self.cohort.get(participant)
+        if experiment_data is not None:
+            self.show_experiment_data(experiment_data)
+        else:
+            self.prepare_and_display_data(*self.cohort.source_files[participant], participant=participant)
 
     def check_file(self, selected_file):
         in_file = QtCore.QFile(selected_file)
@@ -106,47 +133,80 @@ class MainWindow(QMainWindow):
                                           "Open Data File",
                                           "Cannot read file %s:\n%s." % (selected_file, in_file.errorString()))
 
+    def show_sample(self):
+        self.cohort = None
+        self.prepare_and_display_data(
+            behavioral_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_behavioral.csv'),
+            eyetracking_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_eyetracking.csv'),
+            physio_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_physio.csv'),
+            fmri_roi_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01_roi.csv'),
+            fmri_nifti_file=os.path.join(os.path.dirname(__file__), '..', 'sample', 'data', 'p01.nii')
+        )
+
     def prepare_and_display_data(self, behavioral_file, eyetracking_file, physio_file, fmri_roi_file, fmri_nifti_file, participant='p01'):
-        # TODO allow optional data files
-        # merge csv files into one dataframe
-        df_behavioral = pd.read_csv(behavioral_file, sep=',')
-        df_eyetracking = pd.read_csv(eyetracking_file, sep=',')
-        df_physio = pd.read_csv(physio_file, sep=',')
+        # loading & preprocessing runs in a background thread, the data view is only built once everything is ready
+        if self.session_loader is not None:
+            self.session_loader.cancel()
+            self.session_loader.wait()
+            self.progress_dialog.reset()
+
+        self.progress_dialog = QProgressDialog('Loading data ...', "Cancel", 0, 0, self)
+        self.progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(500)
+
+        self.session_loader = SessionLoader.SessionLoader((behavioral_file, eyetracking_file, physio_file, fmri_roi_file, fmri_nifti_file), participant, self)
+        self.session_loader.progress.connect(self.show_progress)
+        self.session_loader.loaded.connect(self.display_data)
+        self.session_loader.failed.connect(self.show_loading_error)
+        self.session_loader.finished.connect(self.loading_finished)
+        self.progress_dialog.canceled.connect(self.session_loader.cancel)
+
+        self.open_data.setEnabled(False)
+        self.open_cohort.setEnabled(False)
+        self.show_sample_data.setEnabled(False)
+        self.session_loader.start()
+
+    def show_progress(self, label, done, total):
+        # signals of a cancelled loader may still be queued
+        if self.sender() is not self.session_loader:
+            return
 
-        df_merged = df_behavioral.merge(df_eyetracking, on='Time', how='left')
-        df_merged = df_merged.merge(df_physio, on='Time', how='left')
+        self.progress_dialog.setLabelText(label)
+        self.progress_dialog.setMaximum(total)
+        self.progress_dialog.setValue(done)
 
-        print(df_merged.head(5))
+    def display_data(self, experiment_data):
+        if self.sender() is not self.session_loader:
+            return
 
-        # TODO change both input csv files to , separated files
-        self.experiment_data = {
-            'participant': participant,
-            'dataframe': df_merged,
-            'fmri': pd.read_csv(fmri_roi_file, sep=';'),
-            'nifti_path': fmri_nifti_file,
-            'conditions': None,
-            'responses': {}
-        }
+        if self.cohort is not None and experiment_data['participant'] in self.cohort.source_files:
+            self.cohort.insert(experiment_data)
 
-        # figure out a list of conditions
-        self.experiment_data['conditions'] = self.experiment_data['dataframe']['Condition'].unique()
+        self.show_experiment_data(experiment_data)
 
-        # clean & preprocess eye-tracking/physio/fMRI data
-        if config.PLUGIN_BEHAVORIAL_ACTIVE:
-            BehavioralView.BehavioralView().clean_behavioral_data(self.experiment_data)
+    def show_experiment_data(self, experiment_data):
+        self.experiment_data = experiment_data
 
-        if config.PLUGIN_EYETRACKING_ACTIVE:
-            EyeTrackingData.clean_eyetracking_data(self.experiment_data)
+        # the data view is reused if it shows the same plugins and cohort, e.g., when switching participants of a cohort
+        data_view = self.centralWidget()
+        if isinstance(data_view, DataView) and data_view.plugins == experiment_data['plugins'] and data_view.cohort is self.cohort:
+            data_view.set_experiment_data(experiment_data)
+        else:
+            self.setCentralWidget(DataView(self, self.experiment_data))
 
-        if config.PLUGIN_PHYSIO_ACTIVE:
-            PsychoPhysiologicalData.preprocess_psychophysio_data(self.experiment_data)
+    def show_loading_error(self, message):
+        QtWidgets.QMessageBox.warning(self, "Open Data File", "Cannot load data:\n%s" % message)
 
-        if config.PLUGIN_FMRI_ACTIVE:
-            fMRIData.preprocess_fMRI_ROI(self.experiment_data)
-            fMRIData.preprocess_fmri_fullbrain(self.experiment_data)
+    def loading_finished(self):
+        if self.sender() is not self.session_loader:
+            return
 
-        data_view = DataView(self, self.experiment_data)
-        self.setCentralWidget(data_view)
+        self.progress_dialog.reset()
+        self.open_data.setEnabled(True)
+        self.open_cohort.setEnabled(True)
+        self.show_sample_data.setEnabled(True)
+        self.session_loader.deleteLater()
+        self.session_loader = None
 
     def settings(self):
         msg_box = QMessageBox()
@@ -161,6 +221,15 @@ class MainWindow(QMainWindow):
         msg_box.exec_()
 
 
+def log_startup_time():
+    startup_time = time.perf_counter() - STARTUP_STARTED
+    heavy_modules = [module for module in ('pandas', 'matplotlib.pyplot', 'scipy', 'sklearn', 'nibabel', 'nilearn') if module in sys.modules]
+    logging.info('startup: window shown after %.2f s (target %.1f s), loaded: %s', startup_time, config.STARTUP_TIME_TARGET, ', '.join(heavy_modules))
+
+    if startup_time > config.STARTUP_TIME_TARGET:
+        logging.warning('startup: slower than the target, run "python -X importtime -m codersmuse.CodersMUSE" for an import-time breakdown')
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
@@ -175,5 +244,6 @@ if __name__ == "__main__":
     mainWin.setWindowTitle('CodersMUSE (fMRI and Eye-Tracking Data Exploration Tool) | v0.1.0')
     mainWin.setWindowIcon(QIcon(os.path.join(os.path.dirname(__file__), 'images', 'icon_brain.png')))
     mainWin.show()
+    QtCore.QTimer.singleShot(0, log_startup_time)
 
     sys.exit(app.exec_())
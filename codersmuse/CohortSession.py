@@ -0,0 +1,67 @@
+import glob
+import logging
+import os
+from collections import OrderedDict
+
+from codersmuse import config
+
+# input files of a participant, e.g., p01_behavioral.csv (same naming as the sample data)
+SOURCE_FILE_PATTERNS = ('%s_behavioral.csv', '%s_eyetracking.csv', '%s_physio.csv', '%s_roi.csv', '%s.nii')
+
+
+def find_participants(directory):
+    # every participant with a behavioral file, the other files are optional (plugins without their data stay inactive)
+    participants = {}
+    for behavioral_file in sorted(glob.glob(os.path.join(directory, '*_behavioral.csv'))):
+        participant = participant_name(behavioral_file)
+        participants[participant] = tuple(os.path.join(directory, pattern % participant) for pattern in SOURCE_FILE_PATTERNS)
+
+    return participants
+
+
+def participant_name(behavioral_file):
+    # e.g., p01 for p01_behavioral.csv
+    name = os.path.splitext(os.path.basename(behavioral_file))[0]
+    return name[:-len('_behavioral')] if name.endswith('_behavioral') else name
+
+
+class CohortSession:
+    """All participants of a study directory. Participants are only loaded on first use and only a few are kept in memory."""
+
+    def __init__(self, directory, resident_participants=config.COHORT_RESIDENT_PARTICIPANTS):
+        self.directory = directory
+        self.resident_participants = resident_participants
+        self.source_files = find_participants(directory)
+        self.participants = list(self.source_files)
+        self.resident = OrderedDict()
+
+        # shared by all participants: one entry per condition with the participants that saw it
+        self.conditions = OrderedDict()
+
+    def get(self, participant):
+        # experiment data of a resident participant, None if it has to be loaded (again)
+        if participant not in self.resident:
+            return None
+
+        self.resident.move_to_end(participant)
+        return self.resident[participant]
+
+    def insert(self, experiment_data):
+        participant = experiment_data['participant']
+
+        # all participants share the condition names (and with them the cached stimulus images)
+        conditions = []
+        for condition in experiment_data['conditions']:
+            entry = self.conditions.setdefault(condition, {'name': condition, 'participants': []})
+            if participant not in entry['participants']:
+                entry['participants'].append(participant)
+            conditions.append(entry['name'])
+        experiment_data['conditions'] = conditions
+
+        self.resident[participant] = experiment_data
+        self.resident.move_to_end(participant)
+
+        # evicted participants only lose their in-memory signals, their session stays in the on-disk cache
+        while len(self.resident) > self.resident_participants:
+            evicted, _ = self.resident.popitem(last=False)
+            logging.info('cohort: evicted %s', evicted)
@@ -0,0 +1,76 @@
+import numpy
+import pandas as pd
+
+
+def build_segment_index(dataframe):
+    # find all contiguous blocks of rows with the same condition in a single pass,
+    # a condition shown more than once gets one segment per occurrence
+    conditions = dataframe['Condition']
+    times = dataframe['Time'].to_numpy()
+
+    if len(conditions) == 0:
+        return {}
+
+    # comparing the integer codes of categorical conditions is much cheaper than comparing strings
+    if isinstance(conditions.dtype, pd.CategoricalDtype):
+        codes = conditions.cat.codes.to_numpy()
+    else:
+        codes = conditions.to_numpy()
+
+    boundaries = numpy.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = numpy.concatenate(([0], boundaries))
+    ends = numpy.concatenate((boundaries, [len(conditions)]))
+
+    segment_index = {}
+    for condition, start, end in zip(conditions.iloc[starts].to_numpy(), starts, ends):
+        segment_index.setdefault(condition, []).append({
+            'start_row': int(start),
+            'end_row': int(end),
+            'start_time': times[start],
+            'end_time': times[end - 1]
+        })
+
+    return segment_index
+
+
+def get_condition_dataframe(experiment_data, condition):
+    # rows of one condition, re-indexed from 0 (a view into the session dataframe if the condition is contiguous)
+    segments = experiment_data['segments'][condition]
+    dataframe = experiment_data['dataframe']
+
+    if len(segments) == 1:
+        condition_dataframe = dataframe.iloc[segments[0]['start_row']:segments[0]['end_row']]
+    else:
+        condition_dataframe = pd.concat([dataframe.iloc[segment['start_row']:segment['end_row']] for segment in segments])
+
+    condition_dataframe.index = pd.RangeIndex(len(condition_dataframe))
+    return condition_dataframe
+
+
+def get_condition_times(experiment_data, condition):
+    # first and last Time value of a condition
+    segments = experiment_data['segments'][condition]
+    return segments[0]['start_time'], segments[-1]['end_time']
+
+
+def find_condition_time(experiment_data, row):
+    # condition and time (row of the condition dataframe) of a row of the session dataframe
+    for condition, segments in experiment_data['segments'].items():
+        offset = 0
+        for segment in segments:
+            if segment['start_row'] <= row < segment['end_row']:
+                return condition, offset + row - segment['start_row']
+            offset += segment['end_row'] - segment['start_row']
+
+    return None, 0
+
+
+def get_session_row(experiment_data, condition, time):
+    # inverse of find_condition_time
+    segments = experiment_data['segments'][condition]
+    for segment in segments:
+        if time < segment['end_row'] - segment['start_row']:
+            return segment['start_row'] + time
+        time -= segment['end_row'] - segment['start_row']
+
+    return segments[-1]['end_row'] - 1
@@ -4,12 +4,9 @@ from PySide2 import QtGui, QtCore, QtWidgets
 from PySide2.QtCore import Qt, QTimer
 from PySide2.QtWidgets import QWidget, QHBoxLayout, QLabel, QPushButton, QVBoxLayout, QMessageBox, QComboBox
 
-from codersmuse import config
-from codersmuse.plugins.behavioral.BehavioralView import BehavioralView
-from codersmuse.plugins.eyetracking.EyeTrackingView import EyeTrackingView
-from codersmuse.plugins.fmri.fMRIFullView import fMRIFullView
-from codersmuse.plugins.fmri.fMRIRoiView import fMRIRoiView
-from codersmuse.plugins.psychophysio.PsychoPhysiologicalView import PsychoPhysiologicalView
+from codersmuse import config, ConditionSegments, PluginRegistry
+from codersmuse.PlaybackClock import PlaybackClock, RefreshSchedule, SeekCoalescer
+from codersmuse.SessionOverview import SessionOverview
 
 SHIFT_FMRI_SCAN = 3
 
@@ -20,19 +17,50 @@ class DataView(QWidget):
 
         self.file_name = None
         self.main_window = main_window
+        self.cohort = main_window.cohort
         self.experiment_data = experiment_data
         self.condition_dataframe = None
+        self.selected_condition = None
         self.maximum_time_sec = None
         self.maximum_time_msec = None
         self.timer = QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.playback_tick)
+        self.playback_clock = PlaybackClock()
+        self.refresh_schedule = RefreshSchedule()
 
-        self.behavioralView = BehavioralView()
-        self.eyetrackingView = EyeTrackingView(main_window)
-        self.physioRespiration = PsychoPhysiologicalView('Respiration')
-        self.physioHeartRate = PsychoPhysiologicalView('HeartRate')
-        self.physioPupilDilation = PsychoPhysiologicalView('PupilDilation')
-        self.fMRIRoiView = fMRIRoiView()
-        self.fMRIFullView = fMRIFullView()
+        # slider moves are coalesced, slow layers are drawn once the slider rests if they do not fit into the frame budget
+        self.seek_coalescer = SeekCoalescer()
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(config.SCRUB_SETTLE_DELAY)
+        self.settle_timer.timeout.connect(self.scrub_settled)
+
+        # views are only created (and their modules imported) for active plugins
+        self.plugins = experiment_data['plugins']
+
+        if 'behavioral' in self.plugins:
+            self.behavioralView = PluginRegistry.get_view_class('behavioral', 'BehavioralView')()
+
+        if 'eyetracking' in self.plugins:
+            self.eyetrackingView = PluginRegistry.get_view_class('eyetracking', 'EyeTrackingView')(main_window)
+
+        if 'psychophysio' in self.plugins:
+            PsychoPhysiologicalView = PluginRegistry.get_view_class('psychophysio', 'PsychoPhysiologicalView')
+            self.physioRespiration = PsychoPhysiologicalView('Respiration')
+            self.physioHeartRate = PsychoPhysiologicalView('HeartRate')
+            self.physioPupilDilation = PsychoPhysiologicalView('PupilDilation')
+
+        if 'fmri' in self.plugins:
+            self.fMRIRoiView = PluginRegistry.get_view_class('fmri', 'fMRIRoiView')()
+            self.fMRIFullView = PluginRegistry.get_view_class('fmri', 'fMRIFullView')()
+
+        PluginRegistry.log_import_times()
+
+        # overview of the whole session, drawn once from the signal envelopes
+        self.session_overview = SessionOverview()
+        self.session_overview.set_experiment_data(experiment_data)
+        self.session_overview.seek_requested.connect(self.seek)
 
         self.create_layout()
 
@@ -50,6 +78,7 @@ class DataView(QWidget):
 
         main_layout = QVBoxLayout(self)
         main_layout.addLayout(center_layout)
+        main_layout.addWidget(self.session_overview)
         main_layout.addLayout(bottom_layout)
 
     def create_layout_left(self):
@@ -58,7 +87,23 @@ class DataView(QWidget):
         self.participant_label.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
         self.participant_label.setTextInteractionFlags(Qt.TextBrowserInteraction)
 
-        left_layout.addWidget(self.participant_label)
+        # participants of a cohort can be switched without rebuilding the view
+        self.participant_selection_box = None
+        if self.cohort is not None:
+            self.participant_label.setText("Participant: ")
+            self.participant_selection_box = QComboBox()
+            self.participant_selection_box.setFont(QtGui.QFont("Times", 14, QtGui.QFont.Normal))
+            self.participant_selection_box.addItems(self.cohort.participants)
+            self.participant_selection_box.setCurrentText(self.experiment_data['participant'])
+            self.participant_selection_box.currentTextChanged.connect(self.participant_changed)
+
+            participant_layout = QHBoxLayout()
+            participant_layout.addWidget(self.participant_label)
+            participant_layout.addWidget(self.participant_selection_box)
+            participant_layout.addStretch()
+            left_layout.addLayout(participant_layout)
+        else:
+            left_layout.addWidget(self.participant_label)
         left_stimuli_layout = QHBoxLayout()
         stimuli_label = QLabel("Stimuli: ")
         stimuli_label.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
@@ -75,11 +120,11 @@ class DataView(QWidget):
         left_layout.addLayout(left_stimuli_layout)
         left_layout.addStretch()
 
-        if config.PLUGIN_EYETRACKING_ACTIVE:
+        if 'eyetracking' in self.plugins:
             self.eyetrackingView.create_view(left_layout)
             left_layout.addStretch()
 
-        if config.PLUGIN_BEHAVORIAL_ACTIVE:
+        if 'behavioral' in self.plugins:
             self.behavioralView.create_view(left_layout)
 
         return left_layout
@@ -96,14 +141,22 @@ class DataView(QWidget):
         self.slider.setTickInterval(100)
         self.slider.setTickPosition(QtWidgets.QSlider.TicksBelow)
         self.slider.setToolTip("Time")
-        self.slider.sliderMoved.connect(self.set_time)
+        self.slider.sliderMoved.connect(self.scrub)
+        self.slider.sliderReleased.connect(self.scrub_settled)
 
         self.playButton = QPushButton("Play")
         self.playButton.clicked.connect(self.play_data)
         self.isPlaying = False
 
+        self.speedSelectionBox = QComboBox()
+        for speed in config.PLAYBACK_SPEEDS:
+            self.speedSelectionBox.addItem(str(speed) + 'x', speed)
+        self.speedSelectionBox.setCurrentIndex(config.PLAYBACK_SPEEDS.index(1))
+        self.speedSelectionBox.currentIndexChanged[int].connect(self.speed_changed)
+
         bottomLayout.addStretch()
         bottomLayout.addWidget(self.playButton)
+        bottomLayout.addWidget(self.speedSelectionBox)
         playerLayout = QVBoxLayout()
         timeLayout = QHBoxLayout()
         timeLayout.addStretch()
@@ -120,7 +173,7 @@ class DataView(QWidget):
     def create_layout_right(self):
         right_layout = QVBoxLayout()
 
-        if config.PLUGIN_PHYSIO_ACTIVE:
+        if 'psychophysio' in self.plugins:
             physio_label = QLabel("Psycho-Physiological Data")
             physio_label.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
             right_layout.addWidget(physio_label)
@@ -135,7 +188,7 @@ class DataView(QWidget):
             right_layout.addLayout(physio_label_layout)
             right_layout.addLayout(physio_plot_layout)
 
-        if config.PLUGIN_FMRI_ACTIVE:
+        if 'fmri' in self.plugins:
             self.fMRIRoiView.create_view(right_layout, self.experiment_data)
             self.fMRIFullView.create_view(right_layout, self.experiment_data)
 
@@ -143,22 +196,88 @@ class DataView(QWidget):
 
         return right_layout
 
+    def participant_changed(self, participant):
+        self.stop_playback()
+        self.main_window.show_participant(participant)
+
+    def set_experiment_data(self, experiment_data):
+        # show another participant with the same plugins, the selected condition is kept if the participant saw it
+        selected_condition = self.stimuli_selection_box.currentText()
+        self.experiment_data = experiment_data
+
+        if self.participant_selection_box is not None:
+            self.participant_selection_box.blockSignals(True)
+            self.participant_selection_box.setCurrentText(experiment_data['participant'])
+            self.participant_selection_box.blockSignals(False)
+        else:
+            self.participant_label.setText("Participant: " + experiment_data['participant'])
+
+        self.stimuli_selection_box.blockSignals(True)
+        self.stimuli_selection_box.clear()
+        for condition in self.experiment_data['conditions']:
+            self.stimuli_selection_box.addItem(condition)
+        index = max(self.stimuli_selection_box.findText(selected_condition), 0)
+        self.stimuli_selection_box.setCurrentIndex(index)
+        self.stimuli_selection_box.blockSignals(False)
+
+        self.stop_playback()
+        self.session_overview.set_experiment_data(experiment_data)
+        self.stimuli_changed(index)
+
     def set_time(self, time):
         self.time = time
+        self.playback_clock.seek(time)
         self.update_data(force_update=True)
 
+    def seek(self, condition, time):
+        # jump to any condition and time, e.g., from the session overview
+        index = self.stimuli_selection_box.findText(condition)
+        if index != self.stimuli_selection_box.currentIndex():
+            self.stimuli_selection_box.setCurrentIndex(index)
+        self.scrub(time)
+
+    def scrub(self, time):
+        # only the latest position is shown, once all queued slider events are handled
+        if self.seek_coalescer.request(time):
+            QTimer.singleShot(0, self.show_scrub_position)
+
+    def show_scrub_position(self):
+        time = self.seek_coalescer.take()
+        if time is None:
+            return
+
+        self.time = time
+        self.playback_clock.seek(time)
+        self.update_data(force_update=True, slow_layers=False)
+
+        if self.seek_coalescer.slow_layers_fit():
+            self.seek_coalescer.draw_slow_layers(self.update_slow_layers)
+        else:
+            self.settle_timer.start()
+        self.seek_coalescer.served()
+
+    def scrub_settled(self):
+        self.settle_timer.stop()
+        self.show_scrub_position()
+        self.seek_coalescer.draw_slow_layers(self.update_slow_layers)
+        self.seek_coalescer.log_latency()
+
+    def speed_changed(self, index):
+        self.playback_clock.set_speed(self.speedSelectionBox.itemData(index))
+
     def stimuli_changed(self, index):
         selected_condition = self.experiment_data['conditions'][index]
+        self.selected_condition = selected_condition
 
-        self.condition_dataframe = self.experiment_data['dataframe'][self.experiment_data['dataframe']['Condition'] == selected_condition]
-        self.condition_start_pos = self.condition_dataframe['Time'].iloc[0]
-        self.condition_end_pos = self.condition_dataframe['Time'].iloc[-1]
-        self.condition_dataframe.reset_index(inplace=True, drop=True)
+        self.condition_dataframe = ConditionSegments.get_condition_dataframe(self.experiment_data, selected_condition)
+        self.condition_start_pos, self.condition_end_pos = ConditionSegments.get_condition_times(self.experiment_data, selected_condition)
 
         self.maximum_time_sec = math.floor(len(self.condition_dataframe) / 100)
         self.maximum_time_msec = len(self.condition_dataframe) % 100
 
         self.time = 0
+        self.playback_clock.seek(0)
+        self.refresh_schedule.reset()
         self.shifted_scan = None
         self.slider.setMaximum(self.maximum_time_sec * 100 + self.maximum_time_msec)
         self.slider.setValue(0)
@@ -166,62 +285,90 @@ class DataView(QWidget):
         self.timeLabel.setText("0:00.00 / 0:" + str(self.maximum_time_sec).zfill(2) + "." + str(self.maximum_time_msec).zfill(2))
 
         # update plug-in views
-        self.behavioralView.update_view(self.experiment_data, selected_condition, self.condition_start_pos)
-        self.eyetrackingView.setConditionDataframe(selected_condition, self.condition_dataframe)
+        if 'behavioral' in self.plugins:
+            self.behavioralView.update_view(self.experiment_data, selected_condition, self.condition_start_pos)
+
+        if 'eyetracking' in self.plugins:
+            # heatmaps may sum up all participants of a cohort that are in memory
+            heatmap_sources = [self.experiment_data]
+            if self.cohort is not None and config.EYETRACKING_HEATMAP_COHORT:
+                heatmap_sources = list(self.cohort.resident.values())
+            self.eyetrackingView.setConditionDataframe(selected_condition, self.condition_dataframe, self.experiment_data, heatmap_sources)
+
+        if 'psychophysio' in self.plugins:
+            self.physioRespiration.set_condition(self.experiment_data, self.condition_start_pos, self.condition_end_pos)
+            self.physioHeartRate.set_condition(self.experiment_data, self.condition_start_pos, self.condition_end_pos)
+            self.physioPupilDilation.set_condition(self.experiment_data, self.condition_start_pos, self.condition_end_pos)
 
         self.update_data()
 
     def play_data(self):
         if self.isPlaying:
-            self.isPlaying = False
-            self.timer.stop()
-            self.playButton.setText('Play')
+            self.stop_playback()
         else:
-            self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
-            self.timer.timeout.connect(self.update_data)
-            self.timer.start(10)
+            self.playback_clock.start(self.time)
+            self.timer.start(config.PLAYBACK_TIMER_INTERVAL)
             self.isPlaying = True
             self.playButton.setText('Stop')
 
-    def update_data(self, force_update=False):
+    def stop_playback(self):
+        self.playback_clock.stop()
+        self.timer.stop()
+        self.isPlaying = False
+        self.playButton.setText('Play')
+
+    def playback_tick(self):
+        # jump straight to the sample matching the wall clock, intermediate samples are dropped when falling behind
+        self.time = self.playback_clock.current_sample()
+        self.update_data()
+
+    def update_data(self, force_update=False, slow_layers=True):
         # check if timer should stop
         if self.time >= (self.maximum_time_sec * 100 + self.maximum_time_msec):
-            self.timer.stop()
-            self.isPlaying = False
-            self.playButton.setText('Play')
+            self.stop_playback()
         else:
             self.slider.setValue(self.time)
+            self.session_overview.set_position(ConditionSegments.get_session_row(self.experiment_data, self.selected_condition, self.time))
             self.timeLabel.setText("0:" + str(math.floor(self.time / 100)).zfill(2) + "." + str(self.time % 100).zfill(2) + " / 0:" + str(self.maximum_time_sec).zfill(2) + "." + str(self.maximum_time_msec).zfill(2))
 
             # psycho-physiological data
-            if force_update or self.time % 10 == 0:
-                self.physioRespiration.update_text(self.condition_dataframe['Respiration'][self.time])
-                self.physioHeartRate.update_text(self.condition_dataframe['HeartRate'][self.time])
-                self.physioPupilDilation.update_text(self.condition_dataframe['PupilDilation'][self.time])
-
-            # only update plots every second instead of every millisecond (for performance)
-            # use preprocessed plots and just switch image for faster speeds
-            if force_update or self.time % 100 == 0:
-                self.physioRespiration.update_plot(self.time)
-                self.physioHeartRate.update_plot(self.time)
-                self.physioPupilDilation.update_plot(self.time)
+            if 'psychophysio' in self.plugins:
+                if self.refresh_schedule.is_due('physio_text', config.REFRESH_RATE_PHYSIO_TEXT, self.time) or force_update:
+                    # read from the physio stream at its native rate, not from the aligned session rows
+                    current_time = self.condition_dataframe['Time'][self.time]
+                    self.physioRespiration.update_text(current_time)
+                    self.physioHeartRate.update_text(current_time)
+                    self.physioPupilDilation.update_text(current_time)
 
             # eye-tracking data
-            self.eyetrackingView.setTime(self.time)
+            if 'eyetracking' in self.plugins:
+                self.eyetrackingView.setTime(self.time)
+
+            if slow_layers:
+                self.update_slow_layers(force_update)
 
-            # fMRI data
-            current_scan = math.floor(((self.condition_start_pos + self.time) / 100) * config.FMRI_RESOLUTION)
-            shifted_scan = current_scan + SHIFT_FMRI_SCAN
+    def update_slow_layers(self, force_update=True):
+        # plots and fMRI images, skipped while scrubbing if they take too long
+        if self.time >= (self.maximum_time_sec * 100 + self.maximum_time_msec):
+            return
+
+        if 'psychophysio' in self.plugins:
+            # live plots follow every frame, preprocessed plot images only switch once per second (for performance)
+            physio_plot_refresh_rate = config.DATA_RESOLUTION if config.PHYSIO_PLOT_MODE == 'live' else config.REFRESH_RATE_PHYSIO_PLOT
+            if self.refresh_schedule.is_due('physio_plot', physio_plot_refresh_rate, self.time) or force_update:
+                self.physioRespiration.update_plot(self.time)
+                self.physioHeartRate.update_plot(self.time)
+                self.physioPupilDilation.update_plot(self.time)
 
-            if self.shifted_scan != shifted_scan:
-                self.fMRIRoiView.update_data(self.experiment_data, current_scan)
-                self.fMRIFullView.update_data(self.experiment_data, shifted_scan)
+        # fMRI data
+        current_scan = math.floor(((self.condition_start_pos + self.time) / 100) * config.FMRI_RESOLUTION)
+        shifted_scan = current_scan + SHIFT_FMRI_SCAN
 
-                self.shifted_scan = shifted_scan
+        if 'fmri' in self.plugins and self.shifted_scan != shifted_scan:
+            self.fMRIRoiView.update_data(self.experiment_data, current_scan)
+            self.fMRIFullView.update_data(self.experiment_data, shifted_scan)
 
-            # todo: it should only add 1ms per tick, for now artificially jump a few ms to fix slow replay time
-            self.time += 4  # my Macbook is really slow
-            # self.time += 2  # windows PC is faster
+            self.shifted_scan = shifted_scan
 
     def dialog(self):
         msg_box = QMessageBox()
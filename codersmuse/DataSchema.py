@@ -0,0 +1,145 @@
+import logging
+
+import numpy
+import pandas as pd
+
+# spreadsheet error values and other tokens that mean "no value" in our input files
+NA_TOKENS = ['#DIV/0!', '#N/A', '#NAME?', '#NUM!', '#VALUE!', 'NaN', 'nan', '-']
+
+# one schema per modality: expected dtype, additional NA tokens and sentinel values that mean "no value",
+# the smaller dtype used for the merged dataframe in compact mode, and whether values may be interpolated in time
+BEHAVIORAL_SCHEMA = {
+    'Time': {'dtype': 'int64', 'compact': 'int32'},
+    'Condition': {'dtype': 'str', 'compact': 'category'},
+    'Response': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'},
+    'Clicktime': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'}
+}
+
+EYETRACKING_SCHEMA = {
+    'Time': {'dtype': 'int64', 'compact': 'int32'},
+    'EyeTracking_X': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'},
+    'EyeTracking_Y': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'},
+    'Gaze': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'Int8', 'interpolate': False}
+}
+
+PHYSIO_SCHEMA = {
+    'Time': {'dtype': 'int64', 'compact': 'int32'},
+    'PupilDilation': {'dtype': 'float64', 'na_values': NA_TOKENS, 'nan_values': [0], 'compact': 'float32'},
+    'Respiration': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'},
+    'HeartRate': {'dtype': 'float64', 'na_values': NA_TOKENS, 'compact': 'float32'}
+}
+
+MODALITY_SCHEMAS = {
+    'behavioral': BEHAVIORAL_SCHEMA,
+    'eyetracking': EYETRACKING_SCHEMA,
+    'physio': PHYSIO_SCHEMA
+}
+
+
+def read_csv(source_file, schema, sep=','):
+    # parse a modality file in one pass: NA tokens are handled by the csv parser, everything else is vectorized
+    dataframe = pd.read_csv(source_file, sep=sep, **_parser_arguments(schema))
+
+    report = apply_schema(dataframe, schema)
+    log_report(source_file, report)
+
+    return dataframe
+
+
+def read_csv_chunks(source_file, schema, sep=',', chunk_size=100000):
+    # same as read_csv, but yields cleaned chunks of chunk_size rows, so memory does not grow with the file
+    total_report = {}
+    with pd.read_csv(source_file, sep=sep, chunksize=chunk_size, **_parser_arguments(schema)) as reader:
+        for chunk in reader:
+            for column, counts in apply_schema(chunk, schema).items():
+                total = total_report.setdefault(column, dict.fromkeys(counts, 0))
+                for name, count in counts.items():
+                    total[name] += count
+            yield chunk
+
+    log_report(source_file, total_report)
+
+
+def _parser_arguments(schema):
+    return {
+        'dtype': {column: 'str' for column, rules in schema.items() if rules['dtype'] == 'str'},
+        'na_values': {column: rules['na_values'] for column, rules in schema.items() if 'na_values' in rules}
+    }
+
+
+def apply_schema(dataframe, schema):
+    # coerce columns to their schema dtype, returns a report of how many values were missing or replaced
+    report = {}
+    for column, rules in schema.items():
+        if column not in dataframe.columns or rules['dtype'] == 'str':
+            continue
+
+        values = dataframe[column]
+        missing = int(values.isna().sum())
+        coerced = 0
+        replaced = 0
+
+        # unexpected tokens are left as text by the parser, convert the whole column at once
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values, errors='coerce')
+            coerced = int(values.isna().sum()) - missing
+
+        if 'nan_values' in rules:
+            sentinels = values.isin(rules['nan_values'])
+            replaced = int(sentinels.sum())
+            if replaced > 0:
+                values = values.mask(sentinels, numpy.nan)
+
+        # integer columns can only keep their dtype if nothing is missing (or fractional, e.g., Time of a 1000 Hz recording)
+        if not rules['dtype'].startswith('int') or _is_integral(values):
+            values = values.astype(rules['dtype'])
+
+        dataframe[column] = values
+        report[column] = {'missing': missing, 'coerced': coerced, 'replaced': replaced}
+
+    return report
+
+
+def log_report(source_file, report):
+    changed = {column: counts for column, counts in report.items() if any(counts.values())}
+    if changed:
+        logging.info('schema: %s: %s', source_file, ', '.join(
+            '%s (%s missing, %s coerced, %s replaced)' % (column, counts['missing'], counts['coerced'], counts['replaced']) for column, counts in changed.items()))
+
+
+def compact_dataframe(dataframe):
+    # convert all columns known to a schema to their compact dtype (e.g., categorical conditions, float32 signals)
+    for schema in MODALITY_SCHEMAS.values():
+        for column, rules in schema.items():
+            if column not in dataframe.columns or 'compact' not in rules:
+                continue
+
+            # integer columns with missing values are only possible with pandas' nullable integer dtypes
+            if rules['compact'].startswith('int') and not _is_integral(dataframe[column]):
+                continue
+
+            dataframe[column] = dataframe[column].astype(rules['compact'])
+
+
+def _is_integral(values):
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return True
+
+    return not values.isna().any() and bool(numpy.all(numpy.mod(values.to_numpy(), 1) == 0))
+
+
+def memory_report(dataframe):
+    # memory usage of the dataframe in bytes, per modality
+    usage = dataframe.memory_usage(deep=True, index=False)
+
+    report = {}
+    for modality, schema in MODALITY_SCHEMAS.items():
+        report[modality] = int(sum(usage[column] for column in schema if column in usage.index and column != 'Time'))
+    report['time'] = int(usage['Time']) if 'Time' in usage.index else 0
+    report['total'] = int(usage.sum())
+
+    return report
+
+
+def log_memory_report(report, label):
+    logging.info('memory (%s): %s', label, ', '.join('%s %.1f MB' % (name, size / 1024 ** 2) for name, size in report.items()))
@@ -0,0 +1,80 @@
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide2 import QtGui
+
+from codersmuse import config
+
+_image_cache = None
+
+
+class ImageCache:
+    """Memory-bounded LRU of decoded plot images. Upcoming frames are decoded ahead of time in a background thread."""
+
+    def __init__(self, max_bytes=config.IMAGE_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.pixmaps = OrderedDict()
+        self.pending = {}
+        # QImage can be decoded outside of the GUI thread, only the QPixmap conversion has to happen in it
+        self.executor = ThreadPoolExecutor(max_workers=config.IMAGE_PREFETCH_THREADS)
+
+    def get_pixmap(self, path):
+        if path is None:
+            return QtGui.QPixmap()
+
+        if path in self.pixmaps:
+            self.pixmaps.move_to_end(path)
+            return self.pixmaps[path]
+
+        if path in self.pending:
+            # already being decoded, waiting for it is still faster than starting over
+            pixmap = QtGui.QPixmap.fromImage(self.pending.pop(path).result())
+        else:
+            logging.debug('image cache: miss for %s', path)
+            pixmap = QtGui.QPixmap(path)
+
+        self.insert(path, pixmap)
+        return pixmap
+
+    def get_scaled_pixmap(self, path, width):
+        # e.g., stimulus images, which are shown at the same size for every participant
+        key = (path, width)
+        if key in self.pixmaps:
+            self.pixmaps.move_to_end(key)
+            return self.pixmaps[key]
+
+        pixmap = self.get_pixmap(path).scaledToWidth(width)
+        self.insert(key, pixmap)
+        return pixmap
+
+    def prefetch(self, paths):
+        # move finished background decodes into the cache, so pending requests do not pile up
+        for path in [path for path, future in self.pending.items() if future.done()]:
+            self.insert(path, QtGui.QPixmap.fromImage(self.pending.pop(path).result()))
+
+        for path in paths:
+            if path is not None and path not in self.pixmaps and path not in self.pending:
+                self.pending[path] = self.executor.submit(QtGui.QImage, path)
+
+    def insert(self, path, pixmap):
+        self.pixmaps[path] = pixmap
+        self.used_bytes += self.pixmap_bytes(pixmap)
+
+        while self.used_bytes > self.max_bytes and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.used_bytes -= self.pixmap_bytes(evicted)
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def get_image_cache():
+    # one cache shared by all frame-based views
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache()
+
+    return _image_cache
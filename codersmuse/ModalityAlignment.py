@@ -0,0 +1,75 @@
+import numpy
+
+
+class ModalityStream:
+    """Signals of one modality at their native sampling rate, queried by time through binary search."""
+
+    def __init__(self, times, columns, hold_columns=()):
+        order = None
+        if len(times) > 1 and numpy.any(numpy.diff(times) < 0):
+            order = numpy.argsort(times, kind='stable')
+
+        self.times = times if order is None else times[order]
+        self.columns = {column: values if order is None else values[order] for column, values in columns.items()}
+        # columns with discrete values (e.g., Gaze) are never interpolated
+        self.hold_columns = set(hold_columns)
+
+        # a sample is valid until the next one is expected, e.g., 1 for 100 Hz data with Time in hundredths of a second
+        self.period = float(numpy.median(numpy.diff(self.times))) if len(self.times) > 1 else 0.0
+
+    @classmethod
+    def from_dataframe(cls, dataframe, schema):
+        times = dataframe['Time'].to_numpy(dtype=float)
+        columns = {column: dataframe[column].to_numpy() for column in dataframe.columns if column != 'Time'}
+        hold_columns = [column for column, rules in schema.items() if not rules.get('interpolate', True)]
+
+        return cls(times, columns, hold_columns)
+
+    def window(self, start_time, end_time):
+        # all samples with start_time <= Time <= end_time, as views into the stream
+        first = numpy.searchsorted(self.times, start_time, side='left')
+        last = numpy.searchsorted(self.times, end_time, side='right')
+
+        return self.times[first:last], {column: values[first:last] for column, values in self.columns.items()}
+
+    def value_at(self, times, column, interpolate=False):
+        # value(s) at arbitrary time(s): last sample at or before t, or linear interpolation between neighbours
+        times = numpy.asarray(times, dtype=float)
+        values = self.columns[column]
+
+        # e.g., a file with a header but no samples
+        if len(self.times) == 0:
+            return numpy.full(times.shape, numpy.nan)
+
+        if interpolate and column not in self.hold_columns and numpy.issubdtype(values.dtype, numpy.floating):
+            result = numpy.interp(times, self.times, values, left=numpy.nan, right=numpy.nan)
+            return result
+
+        positions = numpy.searchsorted(self.times, times, side='right') - 1
+        valid = positions >= 0
+        positions = numpy.clip(positions, 0, len(self.times) - 1)
+
+        # samples only count within one sampling period, gaps in the recording stay gaps
+        valid &= (times - self.times[positions]) < max(self.period, numpy.finfo(float).eps)
+
+        result = values[positions]
+        if not numpy.all(valid):
+            result = result.astype(float)
+            result[~valid] = numpy.nan
+
+        return result
+
+    def resample(self, times, interpolate=False):
+        return {column: self.value_at(times, column, interpolate) for column in self.columns}
+
+
+def align(timeline_dataframe, streams, interpolate=False):
+    # one row per sample of the timeline (behavioral data), each modality looked up at these times
+    aligned = timeline_dataframe.copy()
+    times = timeline_dataframe['Time'].to_numpy(dtype=float)
+
+    for stream in streams:
+        for column, values in stream.resample(times, interpolate).items():
+            aligned[column] = values
+
+    return aligned
@@ -0,0 +1,106 @@
+import logging
+import time
+
+from codersmuse import config
+
+
+class PlaybackClock:
+    """Maps the monotonic wall clock to a sample position, so replay speed does not depend on how fast frames are drawn."""
+
+    def __init__(self, samples_per_second=config.DATA_RESOLUTION):
+        self.samples_per_second = samples_per_second
+        self.speed = 1.0
+        self.start_sample = 0
+        self.start_clock = None
+
+    def is_running(self):
+        return self.start_clock is not None
+
+    def start(self, sample):
+        self.start_sample = sample
+        self.start_clock = time.monotonic()
+
+    def stop(self):
+        self.start_sample = self.current_sample()
+        self.start_clock = None
+
+    def seek(self, sample):
+        self.start_sample = sample
+        if self.is_running():
+            self.start_clock = time.monotonic()
+
+    def set_speed(self, speed):
+        # re-anchor the clock, otherwise the playhead would jump when changing the speed
+        self.seek(self.current_sample())
+        self.speed = speed
+
+    def current_sample(self):
+        # frames that could not be drawn in time are simply skipped
+        if not self.is_running():
+            return self.start_sample
+
+        elapsed = time.monotonic() - self.start_clock
+        return self.start_sample + int(elapsed * self.speed * self.samples_per_second)
+
+
+class RefreshSchedule:
+    """Decides whether a layer is due for an update, given its refresh rate in Hz and the current sample."""
+
+    def __init__(self, samples_per_second=config.DATA_RESOLUTION):
+        self.samples_per_second = samples_per_second
+        self.last_refresh = {}
+
+    def reset(self):
+        self.last_refresh = {}
+
+    def is_due(self, layer, refresh_rate, sample):
+        # compare refresh intervals instead of using a modulo, so skipped samples never skip an update
+        interval = int(sample * refresh_rate / self.samples_per_second)
+        if self.last_refresh.get(layer) == interval:
+            return False
+
+        self.last_refresh[layer] = interval
+        return True
+
+
+class SeekCoalescer:
+    """Keeps only the latest of the seeks requested while scrubbing and decides whether the slow layers fit into the frame budget."""
+
+    def __init__(self, frame_budget=config.SCRUB_FRAME_BUDGET / 1000):
+        self.frame_budget = frame_budget
+        self.pending_sample = None
+        self.requested_clock = None
+        self.slow_layers_seconds = 0.0
+        self.latencies = []
+
+    def request(self, sample):
+        # returns True if no seek is pending, i.e., one has to be scheduled
+        is_first = self.pending_sample is None
+        if is_first:
+            self.requested_clock = time.monotonic()
+        self.pending_sample = sample
+
+        return is_first
+
+    def take(self):
+        sample, self.pending_sample = self.pending_sample, None
+        return sample
+
+    def slow_layers_fit(self):
+        # assumes the slow layers take as long as they did the last time
+        return time.monotonic() - self.requested_clock + self.slow_layers_seconds <= self.frame_budget
+
+    def draw_slow_layers(self, draw):
+        started = time.monotonic()
+        draw()
+        self.slow_layers_seconds = time.monotonic() - started
+
+    def served(self):
+        # latency from the first coalesced request until the seek is shown
+        self.latencies.append(time.monotonic() - self.requested_clock)
+
+    def log_latency(self):
+        if self.latencies:
+            logging.info('scrubbing: %s seeks shown, latency mean %.1f ms, max %.1f ms, slow layers %.1f ms',
+                         len(self.latencies), 1000 * sum(self.latencies) / len(self.latencies), 1000 * max(self.latencies), 1000 * self.slow_layers_seconds)
+        self.latencies = []
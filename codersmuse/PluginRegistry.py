@@ -0,0 +1,110 @@
+import importlib
+import logging
+import os
+import sys
+import time
+
+from codersmuse import config
+
+# every modality declares its setting, the data it needs and where its data functions and views live,
+# the modules are only imported once a plugin is active and its data is present
+PLUGINS = {
+    'behavioral': {
+        'setting': 'PLUGIN_BEHAVORIAL_ACTIVE',
+        'columns': ['Response', 'Clicktime'],
+        'files': [],
+        'data': 'codersmuse.plugins.behavioral.BehavioralData',
+        'cleaners': [('clean_behavioral_data', 'Cleaning behavioral data ...')],
+        'chunk_cleaners': [],
+        'preprocessors': [],
+        'views': {'BehavioralView': 'codersmuse.plugins.behavioral.BehavioralView'}
+    },
+    'eyetracking': {
+        'setting': 'PLUGIN_EYETRACKING_ACTIVE',
+        'columns': ['EyeTracking_X', 'EyeTracking_Y'],
+        'files': [],
+        'data': 'codersmuse.plugins.eyetracking.EyeTrackingData',
+        'cleaners': [],
+        'chunk_cleaners': ['clean_eyetracking_data'],
+        'preprocessors': [('detect_fixation_events', 'Detecting fixations ...')],
+        'views': {'EyeTrackingView': 'codersmuse.plugins.eyetracking.EyeTrackingView'}
+    },
+    'psychophysio': {
+        'setting': 'PLUGIN_PHYSIO_ACTIVE',
+        'columns': ['HeartRate', 'Respiration', 'PupilDilation'],
+        'files': [],
+        'data': 'codersmuse.plugins.psychophysio.PsychoPhysiologicalData',
+        'cleaners': [],
+        'chunk_cleaners': [],
+        'preprocessors': [('build_signal_pyramids', 'Building physio signal envelopes ...'), ('preprocess_psychophysio_data', 'Rendering physio plots ...')],
+        'views': {'PsychoPhysiologicalView': 'codersmuse.plugins.psychophysio.PsychoPhysiologicalView'}
+    },
+    'fmri': {
+        'setting': 'PLUGIN_FMRI_ACTIVE',
+        'columns': [],
+        'files': ['nifti_path'],
+        'data': 'codersmuse.plugins.fmri.fMRIData',
+        'cleaners': [],
+        'chunk_cleaners': [],
+        'preprocessors': [('preprocess_fMRI_ROI', 'Extracting and rendering fMRI ROI signals ...'), ('preprocess_fmri_fullbrain', 'Rendering full-brain fMRI plots ...')],
+        'views': {'fMRIRoiView': 'codersmuse.plugins.fmri.fMRIRoiView', 'fMRIFullView': 'codersmuse.plugins.fmri.fMRIFullView'}
+    }
+}
+
+# seconds spent importing each plugin module
+import_times = {}
+
+
+def active_plugins(experiment_data):
+    return [name for name in PLUGINS if is_active(name, experiment_data)]
+
+
+def is_active(name, experiment_data):
+    plugin = PLUGINS[name]
+    if not getattr(config, plugin['setting']):
+        return False
+
+    columns = available_columns(experiment_data)
+    missing = [column for column in plugin['columns'] if column not in columns]
+    missing += [key for key in plugin['files'] if not experiment_data.get(key) or not os.path.exists(experiment_data[key])]
+    if missing:
+        logging.info('plugin %s: inactive, data is missing (%s)', name, ', '.join(missing))
+        return False
+
+    return True
+
+
+def available_columns(experiment_data):
+    columns = set()
+    if experiment_data.get('dataframe') is not None:
+        columns.update(experiment_data['dataframe'].columns)
+    for stream in experiment_data.get('streams', {}).values():
+        columns.update(stream.columns)
+
+    return columns
+
+
+def get_data_function(name, function_name):
+    return getattr(import_module(PLUGINS[name]['data']), function_name)
+
+
+def get_view_class(name, class_name):
+    return getattr(import_module(PLUGINS[name]['views'][class_name]), class_name)
+
+
+def import_module(module_name):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_times[module_name] = time.perf_counter() - started
+
+    logging.info('plugin import: %s (%.2f s)', module_name, import_times[module_name])
+    return module
+
+
+def log_import_times():
+    if import_times:
+        logging.info('plugin imports: %.2f s in total, %s', sum(import_times.values()), ', '.join(
+            '%s %.2f s' % (module_name.rsplit('.', 1)[-1], seconds) for module_name, seconds in sorted(import_times.items(), key=lambda item: -item[1])))
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy
+
+from codersmuse import config
+
+# bump whenever the look of rendered plots changes, so old images are not served anymore
+RENDER_FORMAT_VERSION = 2
+
+statistics = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0
+}
+
+
+def render_key(kind, **inputs):
+    # content address of one rendered image: hash over the render type, its input data and all render parameters
+    key = hashlib.sha1()
+    key.update(kind.encode())
+    key.update(str(RENDER_FORMAT_VERSION).encode())
+
+    for name in sorted(inputs):
+        value = inputs[name]
+        key.update(name.encode())
+        if isinstance(value, numpy.ndarray):
+            key.update(str(value.dtype).encode())
+            key.update(numpy.ascontiguousarray(value).tobytes())
+        else:
+            key.update(json.dumps(value, default=str).encode())
+
+    return kind + '_' + key.hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(config.RENDER_CACHE_DIRECTORY, key[-2:], key + '.png')
+
+
+def lookup(key):
+    # path of the cached image or None, a hit also marks the image as recently used
+    path = cache_path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        statistics['misses'] += 1
+        return None
+
+    statistics['hits'] += 1
+    return path
+
+
+def evict():
+    # remove least recently used images until the store fits into RENDER_CACHE_SIZE again,
+    # other processes (e.g., batch workers) may evict or write images at the same time
+    if not os.path.isdir(config.RENDER_CACHE_DIRECTORY):
+        return
+
+    entries = []
+    for directory in os.scandir(config.RENDER_CACHE_DIRECTORY):
+        if not directory.is_dir():
+            continue
+
+        for entry in os.scandir(directory.path):
+            # images still being written by another process are not part of the store yet
+            if '.tmp' in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    if total_size <= config.RENDER_CACHE_SIZE:
+        return
+
+    for _, size, path in sorted(entries):
+        total_size -= size
+        try:
+            os.remove(path)
+            statistics['evictions'] += 1
+        except FileNotFoundError:
+            pass
+
+        if total_size <= config.RENDER_CACHE_SIZE:
+            break
+
+
+def log_statistics():
+    requests = statistics['hits'] + statistics['misses']
+    hit_rate = statistics['hits'] / requests if requests > 0 else 0
+    logging.info('render cache: %s hits, %s misses (hit rate %.1f%%), %s evictions',
+                 statistics['hits'], statistics['misses'], hit_rate * 100, statistics['evictions'])
@@ -0,0 +1,42 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from codersmuse import config
+
+
+def render_all(render_function, jobs, progress_callback=None):
+    # render all jobs (dicts of keyword arguments) in a process pool using all cores,
+    # progress_callback(done, total) may return False to cancel the remaining jobs
+    if len(jobs) == 0:
+        return True
+
+    # spawn fresh processes, forked copies of the GUI process must not touch Qt
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=config.RENDER_PROCESSES, mp_context=context)
+
+    completed = True
+    try:
+        futures = [executor.submit(render_function, **job) for job in jobs]
+        for done, future in enumerate(as_completed(futures)):
+            future.result()
+
+            if progress_callback is not None and progress_callback(done + 1, len(jobs)) is False:
+                logging.info('rendering cancelled after %s of %s jobs', done + 1, len(jobs))
+                completed = False
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return completed
+
+
+def save_figure_atomic(figure, output_file, **kwargs):
+    # write into a temporary file first, so a cancelled run never leaves a half-written image
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    root, extension = os.path.splitext(output_file)
+    temp_file = root + '.tmp' + str(os.getpid()) + extension
+
+    figure.savefig(temp_file, **kwargs)
+    os.replace(temp_file, output_file)
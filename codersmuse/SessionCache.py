@@ -0,0 +1,363 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy
+import pandas as pd
+
+from codersmuse import config, DataSchema
+
+# bump whenever the layout or the cleaning steps change, so old caches are ignored
+CACHE_FORMAT_VERSION = 5
+
+HASH_INDEX_FILE = 'hashes.json'
+META_FILE = 'meta.json'
+
+
+def file_fingerprint(path):
+    # content hash of a source file, re-hashed only if its mtime or size changed
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    index = _load_hash_index()
+    entry = index.get(path)
+    if entry is not None and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['sha1']
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as in_file:
+        for block in iter(lambda: in_file.read(1 << 20), b''):
+            sha1.update(block)
+
+    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': sha1.hexdigest()}
+    _save_hash_entry(path, entry)
+
+    return entry['sha1']
+
+
+def session_key(*source_files):
+    # one key for the merged & cleaned session, depends on all inputs, the active plugins and the storage mode
+    key = hashlib.sha1()
+    key.update(str(CACHE_FORMAT_VERSION).encode())
+    for source_file in source_files:
+        # optional files (eye-tracking, physio) may be missing
+        key.update((file_fingerprint(source_file) if source_file and os.path.exists(source_file) else 'missing').encode())
+    for setting in (config.PLUGIN_BEHAVORIAL_ACTIVE, config.PLUGIN_EYETRACKING_ACTIVE, config.COMPACT_DATAFRAME, config.ALIGNMENT_INTERPOLATE):
+        key.update(str(setting).encode())
+
+    return 'session_' + key.hexdigest()
+
+
+def read_csv_cached(source_file, schema, sep=','):
+    # parsed version of a single input file, only re-parsed if the file itself (or its schema) changed
+    key = hashlib.sha1()
+    key.update(str(CACHE_FORMAT_VERSION).encode())
+    key.update(file_fingerprint(source_file).encode())
+    key.update(json.dumps(schema, sort_keys=True).encode())
+    key = 'modality_' + key.hexdigest()
+
+    cached = load_dataframe(key)
+    if cached is not None:
+        logging.info('session cache: using cached %s', source_file)
+        return cached[0]
+
+    # stream the file into the column store, only one chunk of it is ever held in memory
+    with ColumnStoreWriter(key) as store:
+        for chunk in DataSchema.read_csv_chunks(source_file, schema, sep=sep, chunk_size=config.INGESTION_CHUNK_SIZE):
+            store.append(chunk)
+
+    return load_dataframe(key)[0]
+
+
+def load_session(key):
+    # returns a tuple (dataframe, conditions, responses) or None if nothing is cached yet
+    cached = load_dataframe(key)
+    if cached is None or 'conditions' not in cached[1]:
+        return None
+
+    dataframe, meta = cached
+    logging.info('session cache: hit for %s', key)
+
+    conditions = numpy.array(meta['conditions'], dtype=object)
+    return dataframe, conditions, meta['responses']
+
+
+def store_session(key, conditions, responses):
+    # the session dataframe is streamed into the store first, conditions and responses are only known afterwards
+    meta_path = os.path.join(config.CACHE_DIRECTORY, key, META_FILE)
+    with open(meta_path, 'r') as meta_file:
+        meta = json.load(meta_file)
+
+    meta['conditions'] = [str(condition) for condition in conditions]
+    meta['responses'] = {str(condition): {name: to_python(value) for name, value in response.items()}
+                         for condition, response in responses.items()}
+
+    temp_path = _temp_path(meta_path)
+    with open(temp_path, 'w') as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(temp_path, meta_path)
+
+
+def array_key(name, source_file, settings):
+    # key of an array derived from one input file, e.g., the fixations of an eye-tracking recording
+    key = hashlib.sha1()
+    key.update(str(CACHE_FORMAT_VERSION).encode())
+    key.update(file_fingerprint(source_file).encode())
+    key.update(json.dumps(settings, sort_keys=True).encode())
+
+    return name + '_' + key.hexdigest()
+
+
+def load_array(key):
+    array_path = os.path.join(config.CACHE_DIRECTORY, key + '.npy')
+    if not os.path.exists(array_path):
+        return None
+
+    return numpy.load(array_path, mmap_mode='r')
+
+
+def store_array(key, values):
+    os.makedirs(config.CACHE_DIRECTORY, exist_ok=True)
+    array_path = os.path.join(config.CACHE_DIRECTORY, key + '.npy')
+
+    # written to a temporary file first, so an interrupted write is never mistaken for a cached array
+    temp_path = _temp_path(array_path) + '.npy'
+    numpy.save(temp_path, values)
+    os.replace(temp_path, array_path)
+
+
+def load_dataframe(key):
+    cache_path = os.path.join(config.CACHE_DIRECTORY, key)
+    meta_path = os.path.join(cache_path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, 'r') as meta_file:
+        meta = json.load(meta_file)
+
+    # every column is a raw binary file, so it is memory-mapped instead of read
+    columns = {}
+    for i, column in enumerate(meta['columns']):
+        if column in meta['ranges']:
+            start, step, length, dtype = meta['ranges'][column]
+            columns[column] = numpy.arange(start, start + step * length, step, dtype=dtype)
+            continue
+
+        values = _open_column(os.path.join(cache_path, str(i) + '.bin'), meta['dtypes'][column], meta['length'])
+        if column in meta['categories']:
+            values = pd.Categorical.from_codes(numpy.asarray(values), categories=meta['categories'][column])
+            if column not in meta['categorical']:
+                values = values.astype(object)
+        elif column in meta['nullable']:
+            mask = _open_column(os.path.join(cache_path, str(i) + '.mask.bin'), 'bool', meta['length'])
+            values = pd.array(numpy.asarray(values), dtype=meta['nullable'][column])
+            values[numpy.asarray(mask)] = pd.NA
+        columns[column] = values
+
+    return pd.DataFrame(columns, columns=meta['columns'], copy=False), meta
+
+
+def store_dataframe(key, dataframe, meta=None):
+    with ColumnStoreWriter(key, meta) as store:
+        store.append(dataframe)
+
+
+class ColumnStoreWriter:
+    """Writes a dataframe chunk by chunk into one raw binary file per column, only one chunk is held in memory at a time."""
+
+    def __init__(self, key, meta=None):
+        self.key = key
+        self.meta = dict(meta or {})
+        self.cache_path = os.path.join(config.CACHE_DIRECTORY, key)
+        self.temp_path = self.cache_path + '.tmp' + str(os.getpid())
+
+        self.columns = None
+        self.dtypes = {}
+        self.length = 0
+        self.categories = {}
+        self.categorical = []
+        self.nullable = {}
+        self.ranges = {}
+
+    def __enter__(self):
+        if os.path.exists(self.temp_path):
+            shutil.rmtree(self.temp_path)
+        os.makedirs(self.temp_path)
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is not None:
+            shutil.rmtree(self.temp_path, ignore_errors=True)
+            return False
+
+        self.close()
+        return False
+
+    def append(self, dataframe):
+        if self.columns is None:
+            self.set_columns(dataframe)
+
+        for i, column in enumerate(dataframe.columns):
+            values = dataframe[column]
+            name = self.columns[i]
+
+            if name in self.categories:
+                # text columns (e.g., Condition) are stored as integer codes, new categories may appear in every chunk
+                values = self.encode(name, values)
+            elif name in self.nullable:
+                # nullable integers (e.g., Gaze in compact mode) are stored as plain values plus a mask
+                self.write(str(i) + '.mask.bin', values.isna().to_numpy())
+                values = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+            else:
+                values = values.to_numpy()
+                if values.dtype != self.dtypes[name]:
+                    # e.g., a chunk of an integer column with missing values, all earlier chunks are converted as well
+                    self.promote(i, name, numpy.result_type(self.dtypes[name], values.dtype))
+                    values = values.astype(self.dtypes[name])
+
+                if name in self.ranges:
+                    self.ranges[name] = _extend_range(self.ranges[name], values)
+
+            self.write(str(i) + '.bin', values)
+
+        self.length += len(dataframe)
+
+    def set_columns(self, dataframe):
+        self.columns = [str(column) for column in dataframe.columns]
+
+        for column, name in zip(dataframe.columns, self.columns):
+            values = dataframe[column]
+            if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(values):
+                self.categories[name] = []
+                self.dtypes[name] = numpy.dtype('int32')
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    self.categorical.append(name)
+            elif pd.api.types.is_extension_array_dtype(values.dtype):
+                self.nullable[name] = str(values.dtype)
+                self.dtypes[name] = numpy.dtype(values.dtype.numpy_dtype)
+            else:
+                self.dtypes[name] = values.dtype
+                if pd.api.types.is_integer_dtype(values.dtype):
+                    # candidate for a regularly spaced column (e.g., Time), checked while writing
+                    self.ranges[name] = {'start': None, 'step': None, 'last': None}
+
+    def encode(self, name, values):
+        categories = self.categories[name]
+        known = set(categories)
+        categories.extend(category for category in pd.unique(values.dropna().to_numpy(dtype=object)) if category not in known)
+
+        # missing values get the code -1, just like pandas' own categorical codes
+        return pd.Index(categories, dtype=object).get_indexer(values.to_numpy(dtype=object)).astype('int32')
+
+    def promote(self, i, name, dtype):
+        path = os.path.join(self.temp_path, str(i) + '.bin')
+        if self.length > 0:
+            # convert in chunks, so even a late conversion does not read the whole column at once
+            values = _open_column(path, self.dtypes[name], self.length)
+            with open(path + '.promoted', 'wb') as out_file:
+                for start in range(0, self.length, config.INGESTION_CHUNK_SIZE):
+                    values[start:start + config.INGESTION_CHUNK_SIZE].astype(dtype).tofile(out_file)
+            del values
+            os.replace(path + '.promoted', path)
+
+        self.dtypes[name] = numpy.dtype(dtype)
+        if not numpy.issubdtype(dtype, numpy.integer):
+            self.ranges.pop(name, None)
+
+    def write(self, file_name, values):
+        with open(os.path.join(self.temp_path, file_name), 'ab') as out_file:
+            numpy.ascontiguousarray(values).tofile(out_file)
+
+    def close(self):
+        self.meta['columns'] = self.columns or []
+        self.meta['dtypes'] = {name: dtype.str for name, dtype in self.dtypes.items()}
+        self.meta['length'] = self.length
+        self.meta['categories'] = {name: [str(category) for category in categories] for name, categories in self.categories.items()}
+        self.meta['categorical'] = self.categorical
+        self.meta['nullable'] = self.nullable
+        self.meta['ranges'] = {}
+
+        for name, state in self.ranges.items():
+            if state is not None and state['step'] is not None:
+                # regularly spaced integers (e.g., Time) are not kept at all, only start and step
+                self.meta['ranges'][name] = [state['start'], state['step'], self.length, str(self.dtypes[name])]
+                os.remove(os.path.join(self.temp_path, str(self.columns.index(name)) + '.bin'))
+
+        with open(os.path.join(self.temp_path, META_FILE), 'w') as meta_file:
+            json.dump(self.meta, meta_file)
+
+        # swap in the finished directory, so an interrupted write never leaves a broken cache entry
+        if os.path.exists(self.cache_path):
+            shutil.rmtree(self.cache_path)
+        os.replace(self.temp_path, self.cache_path)
+
+        logging.info('session cache: stored %s (%d rows)', self.key, self.length)
+
+
+def _temp_path(path):
+    # one temporary file per process, so parallel writers (e.g., batch workers) never replace each other's files
+    return path + '.tmp' + str(os.getpid())
+
+
+def _load_hash_index():
+    # an unreadable index only costs re-hashing the source files
+    index_path = os.path.join(config.CACHE_DIRECTORY, HASH_INDEX_FILE)
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+    return index if isinstance(index, dict) else {}
+
+
+def _save_hash_entry(path, entry):
+    # merged into the latest index right before writing, entries of concurrent writers may still be lost, but the file stays valid
+    os.makedirs(config.CACHE_DIRECTORY, exist_ok=True)
+    index_path = os.path.join(config.CACHE_DIRECTORY, HASH_INDEX_FILE)
+
+    index = _load_hash_index()
+    index[path] = entry
+
+    temp_path = _temp_path(index_path)
+    with open(temp_path, 'w') as index_file:
+        json.dump(index, index_file)
+    os.replace(temp_path, index_path)
+
+
+def _open_column(path, dtype, length):
+    # empty files cannot be memory-mapped
+    if length == 0:
+        return numpy.empty(0, dtype=dtype)
+
+    return numpy.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+
+def _extend_range(state, values):
+    # state of a regularly spaced column after appending values, None once it is not regular anymore
+    if state is None or len(values) == 0:
+        return state
+
+    if state['last'] is not None:
+        values = numpy.concatenate(([state['last']], values))
+    if len(values) > 1:
+        steps = numpy.diff(values)
+        step = int(steps[0]) if state['step'] is None else state['step']
+        if step == 0 or not numpy.all(steps == step):
+            return None
+        state['step'] = step
+
+    if state['start'] is None:
+        state['start'] = int(values[0])
+    state['last'] = int(values[-1])
+
+    return state
+
+
+def to_python(value):
+    # numpy scalars are not json serializable
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
@@ -0,0 +1,182 @@
+import logging
+import os
+
+from PySide2 import QtCore
+
+from codersmuse import config, ConditionSegments, DataSchema, ModalityAlignment, PluginRegistry, SessionCache
+
+
+class LoadingCancelled(Exception):
+    pass
+
+
+class SessionLoader(QtCore.QThread):
+    """Runs the loading pipeline in a background thread, the GUI thread is only notified through signals."""
+
+    progress = QtCore.Signal(str, int, int)
+    loaded = QtCore.Signal(object)
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+    def __init__(self, source_files, participant='p01', parent=None):
+        super(SessionLoader, self).__init__(parent)
+        self.source_files = source_files
+        self.participant = participant
+        self.cancel_requested = False
+
+    def run(self):
+        try:
+            experiment_data = load_session(*self.source_files, participant=self.participant, progress_callback=self.progress_callback)
+        except LoadingCancelled:
+            logging.info('loading cancelled')
+            self.cancelled.emit()
+            return
+        except Exception as error:
+            logging.exception('loading failed')
+            self.failed.emit(str(error))
+            return
+
+        self.loaded.emit(experiment_data)
+
+    def progress_callback(self, label):
+        # called from the worker thread, the signal is queued to the GUI thread
+        def report_progress(done, total):
+            self.progress.emit(label, done, total)
+            return not self.cancel_requested
+
+        return report_progress
+
+    def cancel(self):
+        self.cancel_requested = True
+
+
+def load_session(behavioral_file, eyetracking_file, physio_file, fmri_roi_file, fmri_nifti_file, participant='p01', progress_callback=None):
+    # progress_callback(label) starts a stage and returns report_progress(done, total), which may return False to cancel
+    # only the behavioral file is required, plugins whose data files are missing stay inactive
+    report_progress = _start_stage(progress_callback, 'Reading input files ...')
+
+    key = None
+    cached_session = None
+    if config.SESSION_CACHE_ACTIVE:
+        key = SessionCache.session_key(behavioral_file, eyetracking_file, physio_file)
+        cached_session = SessionCache.load_session(key)
+
+    experiment_data = {
+        'participant': participant,
+        'dataframe': None,
+        'fmri': None,
+        'fmri_rois': [],
+        'fixations': None,
+        'eyetracking_path': eyetracking_file,
+        'roi_path': fmri_roi_file,
+        'nifti_path': fmri_nifti_file,
+        'conditions': None,
+        'segments': None,
+        'streams': {},
+        'responses': {},
+        'render_frames': {},
+        'signals': {},
+        'plugins': []
+    }
+
+    if cached_session is not None:
+        experiment_data['dataframe'], experiment_data['conditions'], experiment_data['responses'] = cached_session
+        read_modalities(experiment_data, behavioral_file, eyetracking_file, physio_file)
+        experiment_data['segments'] = ConditionSegments.build_segment_index(experiment_data['dataframe'])
+        experiment_data['plugins'] = PluginRegistry.active_plugins(experiment_data)
+    else:
+        # until it is aligned, the dataframe only holds the behavioral timeline
+        experiment_data['dataframe'] = read_modalities(experiment_data, behavioral_file, eyetracking_file, physio_file)
+        experiment_data['plugins'] = PluginRegistry.active_plugins(experiment_data)
+        _report(report_progress, 1, 1)
+
+        clean_data(experiment_data, key, _start_stage(progress_callback, 'Aligning eye-tracking & physio data ...'))
+
+        for name in experiment_data['plugins']:
+            for function_name, label in PluginRegistry.PLUGINS[name]['cleaners']:
+                _start_stage(progress_callback, label)
+                PluginRegistry.get_data_function(name, function_name)(experiment_data)
+
+        if config.SESSION_CACHE_ACTIVE:
+            SessionCache.store_session(key, experiment_data['conditions'], experiment_data['responses'])
+
+    # plugins may preprocess their data, e.g., render plot images (live physio plots do not need any)
+    for name in experiment_data['plugins']:
+        for function_name, label in PluginRegistry.PLUGINS[name]['preprocessors']:
+            preprocess = PluginRegistry.get_data_function(name, function_name)
+            if not preprocess(experiment_data, _start_stage(progress_callback, label)):
+                raise LoadingCancelled()
+
+    PluginRegistry.log_import_times()
+
+    return experiment_data
+
+
+def read_modalities(experiment_data, behavioral_file, eyetracking_file, physio_file):
+    read_csv = SessionCache.read_csv_cached if config.SESSION_CACHE_ACTIVE else DataSchema.read_csv
+    df_behavioral = read_csv(behavioral_file, DataSchema.BEHAVIORAL_SCHEMA, sep=',')
+
+    experiment_data['streams'] = {}
+    for name, source_file, schema in (('eyetracking', eyetracking_file, DataSchema.EYETRACKING_SCHEMA), ('physio', physio_file, DataSchema.PHYSIO_SCHEMA)):
+        if not source_file or not os.path.exists(source_file):
+            logging.info('loading: no %s data (%s is missing)', name, source_file)
+            continue
+
+        experiment_data['streams'][name] = ModalityAlignment.ModalityStream.from_dataframe(read_csv(source_file, schema, sep=','), schema)
+
+    return df_behavioral
+
+
+def clean_data(experiment_data, key=None, report_progress=None):
+    df_behavioral = experiment_data['dataframe']
+    chunk_count = -(-len(df_behavioral) // config.INGESTION_CHUNK_SIZE)
+
+    if config.SESSION_CACHE_ACTIVE:
+        # align, clean & compact the session chunk by chunk into the on-disk store, then open it memory-mapped
+        with SessionCache.ColumnStoreWriter(key) as store:
+            for i in range(chunk_count):
+                start = i * config.INGESTION_CHUNK_SIZE
+                store.append(clean_chunk(experiment_data, df_behavioral.iloc[start:start + config.INGESTION_CHUNK_SIZE]))
+                _report(report_progress, i + 1, chunk_count)
+        df_merged = SessionCache.load_dataframe(key)[0]
+    else:
+        df_merged = clean_chunk(experiment_data, df_behavioral)
+
+    logging.debug('merged data:\n%s', df_merged.head(5))
+    DataSchema.log_memory_report(DataSchema.memory_report(df_merged), 'compact' if config.COMPACT_DATAFRAME else 'full')
+
+    experiment_data['dataframe'] = df_merged
+
+    # figure out a list of conditions
+    experiment_data['conditions'] = experiment_data['dataframe']['Condition'].unique()
+    experiment_data['segments'] = ConditionSegments.build_segment_index(experiment_data['dataframe'])
+
+
+def clean_chunk(experiment_data, df_behavioral):
+    # align eye-tracking & physio data (at their native sampling rate) to a chunk of the behavioral timeline,
+    # all steps only depend on the rows of the chunk
+    df_merged = ModalityAlignment.align(df_behavioral, experiment_data['streams'].values(), interpolate=config.ALIGNMENT_INTERPOLATE)
+
+    for name in experiment_data['plugins']:
+        for function_name in PluginRegistry.PLUGINS[name]['chunk_cleaners']:
+            PluginRegistry.get_data_function(name, function_name)(df_merged)
+
+    if config.COMPACT_DATAFRAME:
+        DataSchema.compact_dataframe(df_merged)
+
+    return df_merged
+
+
+def _start_stage(progress_callback, label):
+    logging.info('loading: %s', label)
+    if progress_callback is None:
+        return None
+
+    report_progress = progress_callback(label)
+    _report(report_progress, 0, 0)
+    return report_progress
+
+
+def _report(report_progress, done, total):
+    if report_progress is not None and report_progress(done, total) is False:
+        raise LoadingCancelled()
@@ -0,0 +1,182 @@
+import logging
+import time
+
+import numpy
+from PySide2 import QtCore, QtGui, QtWidgets
+from PySide2.QtCore import QPointF, QRect, QRectF, Qt
+from PySide2.QtGui import QColor
+
+from codersmuse import config, ConditionSegments, SignalPyramid
+
+CONDITION_LANE_HEIGHT = 14
+SIGNAL_LANE_HEIGHT = 18
+ENVELOPE_COLOR = 0x5a1f77b4  # ARGB
+MEAN_COLOR = 0xff1f77b4
+CONDITION_COLORS = ('#8dd3c7', '#bebada', '#fb8072', '#80b1d3', '#fdb462', '#b3de69', '#fccde5', '#bc80bd')
+
+
+class SessionOverview(QtWidgets.QWidget):
+    """Condition blocks, responses and signal envelopes of the whole session in one strip, clicking it seeks to that condition and time."""
+
+    seek_requested = QtCore.Signal(str, int)
+
+    def __init__(self, parent=None):
+        super(SessionOverview, self).__init__(parent)
+
+        self.experiment_data = None
+        self.times = None
+        self.lanes = []
+        self.background = None
+        self.position = None
+
+        self.setMouseTracking(True)
+        self.setMinimumWidth(200)
+
+    def set_experiment_data(self, experiment_data):
+        self.experiment_data = experiment_data
+        self.times = experiment_data['dataframe']['Time'].to_numpy()
+
+        # one lane per signal: (label, pyramid), physio signals at their native rate
+        self.lanes = []
+        if 'psychophysio' in experiment_data['plugins']:
+            for column in ('HeartRate', 'Respiration', 'PupilDilation'):
+                self.lanes.append((column, SignalPyramid.get_pyramid(experiment_data, column)))
+
+        # the first ROI of the ROI view
+        if 'fmri' in experiment_data['plugins'] and experiment_data['fmri_rois']:
+            roi = experiment_data['fmri_rois'][0]
+            roi_data = experiment_data['fmri'][roi].to_numpy(dtype=float)
+            scan_times = numpy.arange(len(roi_data)) * config.DATA_RESOLUTION / config.FMRI_RESOLUTION
+            self.lanes.append((roi, SignalPyramid.get_pyramid(experiment_data, ('ROI', roi), roi_data, scan_times)))
+
+        self.setFixedHeight(CONDITION_LANE_HEIGHT + SIGNAL_LANE_HEIGHT * len(self.lanes))
+        self.background = None
+        self.position = None
+        self.update()
+
+    def set_position(self, row):
+        # only the old and the new playhead are repainted
+        if self.background is not None and self.position is not None:
+            self.update(self.playhead_rect(self.position))
+        self.position = row
+        if self.background is not None:
+            self.update(self.playhead_rect(self.position))
+
+    def playhead_rect(self, row):
+        return QRect(int(self.row_x(row)) - 1, 0, 3, self.height())
+
+    def row_x(self, rows):
+        return rows * self.width() / max(len(self.times), 1)
+
+    def time_rows(self, times):
+        # rows of the session dataframe for values of the Time column
+        return numpy.interp(times, self.times, numpy.arange(len(self.times)))
+
+    def paintEvent(self, event):
+        if self.experiment_data is None or len(self.times) == 0:
+            return
+
+        if self.background is None or self.background.size() != self.size():
+            self.draw_background()
+
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
+
+        if self.position is not None:
+            x = self.row_x(self.position)
+            painter.setPen(QColor('red'))
+            painter.drawLine(QPointF(x, 0), QPointF(x, self.height()))
+
+    def draw_background(self):
+        # everything but the playhead, only drawn again when the data or the size changes
+        started = time.perf_counter()
+
+        self.background = QtGui.QPixmap(self.size())
+        self.background.fill(Qt.white)
+        painter = QtGui.QPainter(self.background)
+
+        # condition blocks
+        for index, condition in enumerate(self.experiment_data['conditions']):
+            color = QColor(CONDITION_COLORS[index % len(CONDITION_COLORS)])
+            for segment in self.experiment_data['segments'].get(condition, []):
+                left = self.row_x(segment['start_row'])
+                painter.fillRect(QRectF(left, 0, self.row_x(segment['end_row']) - left, CONDITION_LANE_HEIGHT), color)
+
+        # response markers
+        painter.setPen(QColor('black'))
+        for response in self.experiment_data['responses'].values():
+            if response['time'] is not None:
+                x = self.row_x(self.time_rows(response['time']))
+                painter.drawLine(QPointF(x, 0), QPointF(x, CONDITION_LANE_HEIGHT))
+
+        # signal envelopes, about one bucket per pixel
+        painter.setFont(QtGui.QFont("Times", 8, QtGui.QFont.Normal))
+        for index, (label, pyramid) in enumerate(self.lanes):
+            top = CONDITION_LANE_HEIGHT + index * SIGNAL_LANE_HEIGHT
+            self.draw_lane(painter, pyramid, top)
+
+            painter.setPen(QColor('grey'))
+            painter.drawText(QRectF(2, top, self.width(), SIGNAL_LANE_HEIGHT), Qt.AlignLeft | Qt.AlignVCenter, label)
+
+        painter.end()
+        logging.info('session overview: drawn in %.1f ms', (time.perf_counter() - started) * 1000)
+
+    def draw_lane(self, painter, pyramid, top):
+        # rasterized with numpy instead of drawing polygons: one column of pixels per bucket of the envelope
+        if pyramid.limits is None:
+            return
+
+        width = self.width()
+        positions, minimum, maximum, mean = pyramid.envelope(0, len(pyramid.values), width)
+        if len(positions) == 0:
+            return
+        rows = self.time_rows(pyramid.sample_times(positions))
+
+        # the bucket closest to the center of each pixel column, there are at most as many buckets as pixels
+        pixel_rows = (numpy.arange(width) + 0.5) * len(self.times) / width
+        bucket = numpy.searchsorted((rows[1:] + rows[:-1]) / 2, pixel_rows)
+        spacing = rows[1] - rows[0] if len(rows) > 1 else len(self.times)
+        outside = (pixel_rows < rows[0] - spacing / 2) | (pixel_rows > rows[-1] + spacing / 2)
+
+        low, high = pyramid.limits
+        scale = (SIGNAL_LANE_HEIGHT - 2) / ((high - low) or 1)
+        with numpy.errstate(invalid='ignore'):
+            upper = numpy.round(SIGNAL_LANE_HEIGHT - 1 - (maximum[bucket] - low) * scale)
+            lower = numpy.round(SIGNAL_LANE_HEIGHT - 1 - (minimum[bucket] - low) * scale)
+            center = numpy.round(SIGNAL_LANE_HEIGHT - 1 - (mean[bucket] - low) * scale)
+        upper[outside] = numpy.nan
+
+        # missing values compare False, so their columns stay transparent
+        y = numpy.arange(SIGNAL_LANE_HEIGHT)[:, None]
+        pixels = numpy.zeros((SIGNAL_LANE_HEIGHT, width), dtype=numpy.uint32)
+        with numpy.errstate(invalid='ignore'):
+            pixels[(y >= upper) & (y <= lower)] = ENVELOPE_COLOR
+            pixels[(y == center) & ~outside] = MEAN_COLOR
+
+        image = QtGui.QImage(pixels.data, width, SIGNAL_LANE_HEIGHT, width * 4, QtGui.QImage.Format_ARGB32)
+        painter.drawImage(0, top, image)
+
+    def find_condition_time(self, x):
+        row = min(max(int(x * len(self.times) / max(self.width(), 1)), 0), len(self.times) - 1)
+        return ConditionSegments.find_condition_time(self.experiment_data, row)
+
+    def mousePressEvent(self, event):
+        if self.experiment_data is not None and event.button() == Qt.LeftButton:
+            self.seek(event.pos().x())
+
+    def mouseMoveEvent(self, event):
+        if self.experiment_data is None:
+            return
+
+        if event.buttons() & Qt.LeftButton:
+            self.seek(event.pos().x())
+        else:
+            condition, time_in_condition = self.find_condition_time(event.pos().x())
+            if condition is not None:
+                self.setToolTip('%s, %.2f s' % (condition, time_in_condition / config.DATA_RESOLUTION))
+
+    def seek(self, x):
+        condition, time_in_condition = self.find_condition_time(x)
+        if condition is not None:
+            self.seek_requested.emit(condition, time_in_condition)
+
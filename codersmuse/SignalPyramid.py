@@ -0,0 +1,115 @@
+import numpy
+
+from codersmuse import config
+
+
+class SignalPyramid:
+    """Min/max/mean envelope of a signal at several resolutions, so plots only draw about one point per pixel."""
+
+    def __init__(self, values, times=None, factor=config.PYRAMID_FACTOR):
+        self.values = numpy.asarray(values, dtype=float)
+        self.factor = factor
+
+        # Time of every sample (e.g., of a stream at its native rate), by default the sample index
+        self.times = numpy.arange(len(self.values), dtype=float) if times is None else numpy.asarray(times, dtype=float)
+
+        # level i summarizes buckets of factor ** i samples, level 0 are the samples themselves
+        finite = numpy.isfinite(self.values)
+        self.levels = [{
+            'minimum': self.values,
+            'maximum': self.values,
+            'total': numpy.where(finite, self.values, 0),
+            'count': finite.astype(numpy.int32)
+        }]
+        while len(self.levels[-1]['minimum']) > 1:
+            self.levels.append(self.reduce_level(self.levels[-1]))
+
+        # limits of the whole signal, e.g., for the y axis
+        top = self.levels[-1]
+        self.limits = (float(top['minimum'][0]), float(top['maximum'][0])) if len(self.values) > 0 and top['count'][0] > 0 else None
+
+    def reduce_level(self, level):
+        # nan-aware: fmin/fmax ignore missing values, buckets without any value stay nan
+        padding = -len(level['minimum']) % self.factor
+
+        def buckets(values, fill):
+            return numpy.concatenate((values, numpy.full(padding, fill, dtype=values.dtype))).reshape(-1, self.factor)
+
+        return {
+            'minimum': numpy.fmin.reduce(buckets(level['minimum'], numpy.nan), axis=1),
+            'maximum': numpy.fmax.reduce(buckets(level['maximum'], numpy.nan), axis=1),
+            'total': buckets(level['total'], 0).sum(axis=1),
+            'count': buckets(level['count'], 0).sum(axis=1)
+        }
+
+    def sample_range(self, start_time, end_time):
+        # samples start:end with start_time <= Time <= end_time
+        return numpy.searchsorted(self.times, start_time, side='left'), numpy.searchsorted(self.times, end_time, side='right')
+
+    def sample_times(self, positions):
+        # Time of (fractional) sample positions, e.g., of bucket centers
+        if len(self.times) == 0:
+            return numpy.asarray(positions, dtype=float)
+
+        return numpy.interp(positions, numpy.arange(len(self.times)), self.times)
+
+    def depth(self, start, end, max_points):
+        # finest level with at most max_points buckets, e.g., one bucket per pixel
+        depth = 0
+        while depth + 1 < len(self.levels) and (end - start) / self.factor ** depth > max(max_points, 1):
+            depth += 1
+
+        return depth
+
+    def envelope(self, start, end, max_points):
+        # (positions, minimum, maximum, mean) of samples start:end, with at most about max_points buckets
+        start = max(int(start), 0)
+        end = min(int(end), len(self.values))
+        if end <= start:
+            empty = numpy.empty(0)
+            return empty, empty, empty, empty
+
+        depth = self.depth(start, end, max_points)
+        bucket_size = self.factor ** depth
+        first = start // bucket_size
+        last = -(-end // bucket_size)
+        level = self.levels[depth]
+
+        count = level['count'][first:last]
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = level['total'][first:last] / count
+        mean[count == 0] = numpy.nan
+
+        positions = (numpy.arange(first, last) + 0.5) * bucket_size - 0.5
+        return positions, level['minimum'][first:last], level['maximum'][first:last], mean
+
+    def envelope_line(self, start, end, max_points):
+        # a single line through the minimum and maximum of every bucket, keeps peaks that averaging would hide
+        start = max(int(start), 0)
+        end = min(int(end), len(self.values))
+        if end <= start or self.depth(start, end, max_points) == 0:
+            return numpy.arange(start, max(end, start), dtype=float), self.values[start:max(end, start)]
+
+        positions, minimum, maximum, _ = self.envelope(start, end, max_points)
+        return numpy.repeat(positions, 2), numpy.column_stack((minimum, maximum)).ravel()
+
+
+def get_pyramid(experiment_data, column, values=None, times=None):
+    # built once per participant, kept with its other derived signals (values of signals outside the session data, e.g., ROI data)
+    key = ('pyramid', column)
+    if key not in experiment_data['signals']:
+        if values is None:
+            values, times = signal_values(experiment_data, column)
+        experiment_data['signals'][key] = SignalPyramid(values, times)
+
+    return experiment_data['signals'][key]
+
+
+def signal_values(experiment_data, column):
+    # samples of a column at its native rate, if it comes from a stream, and their times
+    for stream in experiment_data['streams'].values():
+        if column in stream.columns:
+            return stream.columns[column].astype(float), stream.times
+
+    dataframe = experiment_data['dataframe']
+    return dataframe[column].to_numpy(dtype=float), dataframe['Time'].to_numpy(dtype=float)
@@ -1,15 +1,60 @@
+import os
+
 WINDOW_WIDTH = 1500
 
 PLUGIN_BEHAVORIAL_ACTIVE = True
 PLUGIN_EYETRACKING_ACTIVE = True
 PLUGIN_PHYSIO_ACTIVE = True
 PLUGIN_FMRI_ACTIVE = False
+STARTUP_TIME_TARGET = 1.0  # in seconds until the main window is shown, plugins are only imported once their data is loaded
+
+SESSION_CACHE_ACTIVE = True  # reuse merged & cleaned data of unchanged input files
+COMPACT_DATAFRAME = True  # categorical conditions, float32 signals and a small-int gaze column
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp', 'cache')
+INGESTION_CHUNK_SIZE = 100000  # rows of an input file read & cleaned at a time, bounds the memory needed for importing
+RENDER_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'render')
+RENDER_CACHE_SIZE = 2 * 1024 ** 3  # in bytes, least recently used plot images are removed beyond that
+
+DATA_RESOLUTION = 100  # samples per second of the behavioral Time column, other modalities may use their own rate
+ALIGNMENT_INTERPOLATE = False  # interpolate between samples of other modalities instead of using the last sample
+
+PLAYBACK_SPEEDS = [0.25, 0.5, 1, 2, 4, 8]
+PLAYBACK_TIMER_INTERVAL = 10  # in milliseconds, frames are dropped if drawing takes longer
+REFRESH_RATE_PHYSIO_TEXT = 10  # in updates per second
+REFRESH_RATE_PHYSIO_PLOT = 1  # in updates per second, only used for preprocessed plot images
+SCRUB_FRAME_BUDGET = 25  # in milliseconds per seek while scrubbing, slow layers (plots, fMRI) are skipped if they do not fit
+SCRUB_SETTLE_DELAY = 150  # in milliseconds without slider movement until skipped slow layers are drawn
+
+RENDER_PROCESSES = None  # number of processes rendering plot images, None uses all cores
+COHORT_RESIDENT_PARTICIPANTS = 4  # participants of a cohort kept in memory for fast switching
+IMAGE_CACHE_SIZE = 256 * 1024 ** 2  # in bytes, decoded plot images kept in memory
+IMAGE_PREFETCH_FRAMES = 5  # number of upcoming plot images decoded ahead of the playhead
+IMAGE_PREFETCH_THREADS = 2
+
+PHYSIO_PLOT_MODE = 'live'  # alternatively, use 'images' (preprocessed plot images)
+PYRAMID_FACTOR = 4  # samples per bucket between two levels of the min/max/mean signal envelopes
 
-EYETRACKING_DRAW_MODE = 'saccades'  # alternatively, use 'gazepath'
+EYETRACKING_DRAW_MODE = 'saccades'  # alternatively, use 'gazepath' or 'heatmap' (all fixations of a condition)
+EYETRACKING_HEATMAP_CELL_SIZE = 8  # in stimulus pixels per heatmap cell
+EYETRACKING_HEATMAP_SIGMA = 24  # in stimulus pixels, gaussian smoothing of the heatmap
+EYETRACKING_HEATMAP_COHORT = False  # sum up the heatmaps of all participants of a cohort kept in memory
+EYETRACKING_AOI_DETECT_LINES = True  # use the text lines of a stimulus as areas of interest if there is no <stimulus>_aoi.csv
+EYETRACKING_AOI_CELL_SIZE = 4  # in stimulus pixels per cell of the AOI lookup grid
 EYETRACKING_LENGTH_TRACE = 150  # in milliseconds
+EYETRACKING_EVENT_DETECTION = 'gaze'  # fixations from the Gaze column, alternatively, classify raw gaze samples with 'ivt' (velocity) or 'idt' (dispersion)
+EYETRACKING_VELOCITY_THRESHOLD = 1000  # in pixels per second, for 'ivt'
+EYETRACKING_DISPERSION_THRESHOLD = 40  # in pixels (x range + y range), for 'idt'
+EYETRACKING_MIN_FIXATION_DURATION = 80  # in milliseconds, shorter fixations are dropped by 'ivt' and 'idt'
 
 FMRI_RESOLUTION = 0.5  # in scans per second
 FMRI_DELAY = 6  # assumed haemodynamic response delay in seconds
-FMRI_CUT_SLICE_X = 15
+FMRI_VOLUME_CACHE_SIZE = 8  # number of decoded scans kept in memory
+FMRI_FULLBRAIN_MODE = 'slices'  # alternatively, use 'images' (preprocessed nilearn plot images)
+FMRI_SLICE_VIEW_HEIGHT = 240  # in pixels, for 'slices'
+FMRI_CUT_SLICE_X = 15  # in world coordinates, initial crosshair for 'slices'
 FMRI_CUT_SLICE_Y = 20
 FMRI_CUT_SLICE_Z = 15
+FMRI_ROI_ATLAS = None  # label image on the voxel grid of the scans, one ROI per label, names from <atlas>.csv (Label,Name)
+FMRI_ROI_MASKS = {}  # further ROIs from binary mask images, e.g., {'BA6': 'masks/ba6.nii.gz'}
+FMRI_ROI_PLOTS = None  # names of the ROIs that can be selected in the ROI view, None for all
+FMRI_ROI_BLOCK_SCANS = 16  # scans read at once when extracting ROI signals
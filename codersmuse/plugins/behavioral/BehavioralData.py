@@ -0,0 +1,24 @@
+import pandas as pd
+
+from codersmuse import ConditionSegments
+
+
+def clean_behavioral_data(experiment_data):
+    # behavioral data: find response for each condition
+    for condition in experiment_data['conditions']:
+        condition_dataframe = ConditionSegments.get_condition_dataframe(experiment_data, condition)
+
+        response_df = condition_dataframe[~pd.isnull(condition_dataframe['Response'])]
+
+        response = {
+            'time': None,
+            'answer': None,
+            'clicktime': None
+        }
+
+        if len(response_df) > 0:
+            response['time'] = response_df['Time'].iloc[0]
+            response['answer'] = response_df['Response'].iloc[0]
+            response['clicktime'] = response_df['Clicktime'].iloc[0]
+
+        experiment_data['responses'][condition] = response
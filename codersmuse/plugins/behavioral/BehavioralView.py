@@ -1,6 +1,5 @@
 import math
 
-import pandas as pd
 from PySide2 import QtGui, QtCore
 from PySide2.QtWidgets import QHBoxLayout, QLabel
 
@@ -12,26 +11,6 @@ class BehavioralView:
         self.timeLabel = QLabel("")
         self.clickTimeLabel = QLabel("")
 
-    def clean_behavioral_data(self, experiment_data):
-        # behavioral data: find response for each condition
-        for condition in experiment_data['conditions']:
-            condition_dataframe = experiment_data['dataframe'][experiment_data['dataframe']['Condition'] == condition]
-
-            response_df = condition_dataframe[~pd.isnull(condition_dataframe['Response'])]
-
-            response = {
-                'time': None,
-                'answer': None,
-                'clicktime': None
-            }
-
-            if len(response_df) > 0:
-                response['time'] = response_df['Time'].iloc[0]
-                response['answer'] = response_df['Response'].iloc[0]
-                response['clicktime'] = response_df['Clicktime'].iloc[0]
-
-            experiment_data['responses'][condition] = response
-
     def create_view(self, parent_layout):
         self.title.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
         parent_layout.addWidget(self.title)
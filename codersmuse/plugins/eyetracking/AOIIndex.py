@@ -0,0 +1,163 @@
+import logging
+import math
+import os
+
+import numpy
+import pandas as pd
+from PySide2 import QtGui
+
+from codersmuse import config
+
+# per stimulus, e.g., grey_aoi.csv next to grey.png, with the columns Name,Left,Top,Right,Bottom in stimulus pixels
+AOI_FILE_SUFFIX = '_aoi.csv'
+
+_aoi_indexes = {}
+
+
+class AOIIndex:
+    """Areas of interest of one stimulus (e.g., code lines or tokens) rasterized into a grid, so gaze points are mapped with one array lookup."""
+
+    def __init__(self, names, boxes, image_size, cell_size=config.EYETRACKING_AOI_CELL_SIZE):
+        self.names = list(names)
+        self.boxes = numpy.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.cell_size = cell_size
+
+        # later AOIs are drawn over earlier ones, e.g., tokens defined after the lines they are on
+        width, height = image_size
+        self.grid = numpy.full((math.ceil(height / cell_size), math.ceil(width / cell_size)), -1, dtype=numpy.int32)
+        for i, (left, top, right, bottom) in enumerate(self.boxes):
+            self.grid[max(int(top // cell_size), 0):math.ceil(bottom / cell_size), max(int(left // cell_size), 0):math.ceil(right / cell_size)] = i
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, gaze_x, gaze_y):
+        # AOI of every gaze point, -1 for points outside of all AOIs (or missing)
+        gaze_x = numpy.asarray(gaze_x, dtype=float)
+        gaze_y = numpy.asarray(gaze_y, dtype=float)
+
+        with numpy.errstate(invalid='ignore'):
+            column = numpy.floor(gaze_x / self.cell_size)
+            row = numpy.floor(gaze_y / self.cell_size)
+            inside = (column >= 0) & (column < self.grid.shape[1]) & (row >= 0) & (row < self.grid.shape[0])
+
+        aois = numpy.full(len(gaze_x), -1, dtype=numpy.int32)
+        aois[inside] = self.grid[row[inside].astype(numpy.intp), column[inside].astype(numpy.intp)]
+
+        return aois
+
+
+def get_aoi_index(image_path):
+    # shared by all participants, like the stimulus images
+    image_path = os.path.normpath(image_path)
+    if image_path not in _aoi_indexes:
+        _aoi_indexes[image_path] = load_aoi_index(image_path)
+
+    return _aoi_indexes[image_path]
+
+
+def load_aoi_index(image_path):
+    image = QtGui.QImage(image_path)
+    image_size = (image.width(), image.height())
+
+    aoi_path = os.path.splitext(image_path)[0] + AOI_FILE_SUFFIX
+    if os.path.exists(aoi_path):
+        aois = pd.read_csv(aoi_path, sep=',')
+        logging.info('aoi: %s areas of interest from %s', len(aois), aoi_path)
+        return AOIIndex(aois['Name'].astype(str), aois[['Left', 'Top', 'Right', 'Bottom']].to_numpy(dtype=float), image_size)
+
+    if not config.EYETRACKING_AOI_DETECT_LINES or image.isNull():
+        return AOIIndex([], [], image_size)
+
+    boxes = detect_line_boxes(image)
+    logging.info('aoi: %s text lines detected in %s', len(boxes), image_path)
+    return AOIIndex(['line %s' % (i + 1) for i in range(len(boxes))], boxes, image_size)
+
+
+def detect_line_boxes(image):
+    # text lines of a code snippet: runs of pixel rows that differ from the background color
+    gray_image = image.convertToFormat(QtGui.QImage.Format_Grayscale8)
+    pixels = numpy.frombuffer(gray_image.constBits(), dtype=numpy.uint8, count=gray_image.bytesPerLine() * gray_image.height())
+    pixels = pixels.reshape(gray_image.height(), gray_image.bytesPerLine())[:, :gray_image.width()]
+
+    background = numpy.bincount(pixels.ravel(), minlength=256).argmax()
+    ink = numpy.abs(pixels.astype(numpy.int16) - background) > 40
+
+    # small gaps (e.g., the dot of an i) do not split a line
+    rows = ink.any(axis=1)
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], rows.astype(numpy.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+    if len(starts) == 0:
+        return numpy.empty((0, 4))
+    keep = numpy.concatenate(([True], starts[1:] - ends[:-1] > 2))
+    starts, ends = starts[keep], numpy.concatenate((ends[numpy.flatnonzero(keep)[1:] - 1], ends[-1:]))
+
+    boxes = []
+    for start, end in zip(starts, ends):
+        columns = numpy.flatnonzero(ink[start:end].any(axis=0))
+        boxes.append([columns[0], start, columns[-1] + 1, end])
+    boxes = numpy.array(boxes, dtype=float).reshape(-1, 4)
+
+    # gaze is not exact: lines reach halfway to their neighbours (at most one line height), and as far to the sides
+    if len(boxes) > 0:
+        heights = boxes[:, 3] - boxes[:, 1]
+        gaps = numpy.concatenate(([numpy.inf], boxes[1:, 1] - boxes[:-1, 3], [numpy.inf]))
+        boxes[:, 1] -= numpy.minimum(gaps[:-1] / 2, heights)
+        boxes[:, 3] += numpy.minimum(gaps[1:] / 2, heights)
+        boxes[:, 0] -= heights
+        boxes[:, 2] += heights
+
+    return boxes
+
+
+def condition_fixations(experiment_data, condition):
+    # fixation events that start within a condition, with their start in milliseconds since the condition started
+    events = experiment_data['fixations']
+    selected = []
+    offsets = []
+    offset = 0
+    for segment in experiment_data['segments'][condition]:
+        first = numpy.searchsorted(events['start'], segment['start_time'], side='left')
+        last = numpy.searchsorted(events['start'], segment['end_time'], side='right')
+        selected.append(numpy.arange(first, last))
+        offsets.append(numpy.full(last - first, offset - segment['start_time'], dtype=float))
+        offset += segment['end_row'] - segment['start_row']
+
+    selected = numpy.concatenate(selected)
+    condition_times = (events['start'][selected] + numpy.concatenate(offsets)) * 1000 / config.DATA_RESOLUTION
+
+    return events[selected], condition_times
+
+
+def get_aoi_metrics(experiment_data, condition, aoi_index):
+    # dwell time, time to first fixation and transitions per AOI, computed once per participant and condition
+    key = ('aoi_metrics', condition)
+    if key in experiment_data['signals']:
+        return experiment_data['signals'][key]
+
+    aoi_count = len(aoi_index)
+    events, condition_times = condition_fixations(experiment_data, condition)
+    aois = aoi_index.lookup(events['x'], events['y'])
+    on_aoi = aois >= 0
+
+    dwell = numpy.bincount(aois[on_aoi], weights=events['duration'][on_aoi], minlength=aoi_count)
+    fixation_count = numpy.bincount(aois[on_aoi], minlength=aoi_count)
+
+    # fixations are in time order, so the first occurrence of every AOI is its earliest fixation
+    first_fixation = numpy.full(aoi_count, numpy.nan)
+    fixated, first = numpy.unique(aois[on_aoi], return_index=True)
+    first_fixation[fixated] = condition_times[on_aoi][first]
+
+    # transitions between consecutive fixations on different AOIs (fixations outside of all AOIs are skipped)
+    sequence = aois[on_aoi]
+    changes = sequence[1:] != sequence[:-1]
+    transitions = numpy.bincount(sequence[:-1][changes] * aoi_count + sequence[1:][changes], minlength=aoi_count * aoi_count).reshape(aoi_count, aoi_count)
+
+    experiment_data['signals'][key] = {
+        'names': aoi_index.names,
+        'dwell': dwell,
+        'fixation_count': fixation_count,
+        'first_fixation': first_fixation,
+        'transitions': transitions
+    }
+    return experiment_data['signals'][key]
@@ -1,11 +1,43 @@
-import numpy
-import pandas as pd
+import logging
+import time
 
+from codersmuse import config, DataSchema, SessionCache
+from codersmuse.plugins.eyetracking import FixationDetection
 
-def clean_eyetracking_data(experiment_data):
-    # eye-tracking data: clean eye-tracking data (e.g., DIV/0!)
-    experiment_data['dataframe']['EyeTracking_X'] = experiment_data['dataframe']['EyeTracking_X'].apply(pd.to_numeric, errors='coerce')
-    experiment_data['dataframe']['EyeTracking_Y'] = experiment_data['dataframe']['EyeTracking_Y'].apply(pd.to_numeric, errors='coerce')
-    experiment_data['dataframe']['PupilDilation'] = experiment_data['dataframe']['PupilDilation'].apply(pd.to_numeric, errors='coerce')
-    experiment_data['dataframe']['PupilDilation'] = experiment_data['dataframe']['PupilDilation'].replace({0: numpy.nan})
-    experiment_data['dataframe']['Gaze'] = experiment_data['dataframe']['Gaze'].apply(pd.to_numeric, errors='coerce')
+
+def clean_eyetracking_data(dataframe):
+    # eye-tracking data: clean eye-tracking data (e.g., DIV/0!), columns that were already parsed with their schema are only checked
+    schema = dict(DataSchema.EYETRACKING_SCHEMA, PupilDilation=DataSchema.PHYSIO_SCHEMA['PupilDilation'])
+    del schema['Time']
+
+    DataSchema.apply_schema(dataframe, schema)
+
+
+def detect_fixation_events(experiment_data, progress_callback=None):
+    # fixation events of the raw eye-tracking recording (at its native sampling rate), cached per input file and settings
+    stream = experiment_data['streams']['eyetracking']
+    method = config.EYETRACKING_EVENT_DETECTION
+    if method == 'gaze' and 'Gaze' not in stream.columns:
+        logging.info('eyetracking: no Gaze column, detecting fixations with ivt')
+        method = 'ivt'
+
+    key = None
+    if config.SESSION_CACHE_ACTIVE:
+        settings = {'method': method, 'velocity': config.EYETRACKING_VELOCITY_THRESHOLD, 'dispersion': config.EYETRACKING_DISPERSION_THRESHOLD,
+                    'min_duration': config.EYETRACKING_MIN_FIXATION_DURATION, 'resolution': config.DATA_RESOLUTION}
+        key = SessionCache.array_key('fixations', experiment_data['eyetracking_path'], settings)
+        experiment_data['fixations'] = SessionCache.load_array(key)
+
+    if experiment_data['fixations'] is None:
+        started = time.perf_counter()
+        experiment_data['fixations'] = FixationDetection.detect_fixations(
+            stream.times, stream.columns['EyeTracking_X'], stream.columns['EyeTracking_Y'], method, stream.columns.get('Gaze'))
+        logging.info('eyetracking: %s fixations in %s samples (%s) in %.2f s', len(experiment_data['fixations']), len(stream.times), method, time.perf_counter() - started)
+
+        if key is not None:
+            SessionCache.store_array(key, experiment_data['fixations'])
+
+    if progress_callback is not None and progress_callback(1, 1) is False:
+        return False
+
+    return True
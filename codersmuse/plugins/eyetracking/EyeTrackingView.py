@@ -1,11 +1,14 @@
 import logging
 import os
 
+import numpy
 from PySide2 import QtWidgets, QtGui
-from PySide2.QtGui import QPixmap, QColor
+from PySide2.QtCore import QPointF, QRectF
+from PySide2.QtGui import QColor, QPolygonF
 from PySide2.QtWidgets import QLabel
 
-from codersmuse import config
+from codersmuse import config, ImageCache
+from codersmuse.plugins.eyetracking import AOIIndex, FixationDetection, GazeHeatmap
 
 
 class EyeTrackingView(QtWidgets.QWidget):
@@ -15,25 +18,66 @@ class EyeTrackingView(QtWidgets.QWidget):
         self.main_window = main_window
         self.eyetracking_title = QLabel("Eye-Tracking Data")
         self.eyetracking_overlay = EyeTrackingOverlay(main_window)
+        self.aoi_label = QLabel("")
+        self.aoi_summary = ""
+        self.current_aoi = None
 
     def create_view(self, parent_layout):
         self.eyetracking_title.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
         parent_layout.addWidget(self.eyetracking_title)
         parent_layout.addWidget(self.eyetracking_overlay)
 
-    def setConditionDataframe(self, selected_condition, selected_condition_dataframe):
-        self.eyetracking_overlay.setConditionDataframe(selected_condition, selected_condition_dataframe)
+        self.aoi_label.setFont(QtGui.QFont("Times", 14, QtGui.QFont.Normal))
+        parent_layout.addWidget(self.aoi_label)
+
+    def setConditionDataframe(self, selected_condition, selected_condition_dataframe, experiment_data=None, heatmap_sources=None):
+        self.eyetracking_overlay.setConditionDataframe(selected_condition, selected_condition_dataframe, experiment_data, heatmap_sources)
+
+        # AOI metrics of the condition: the AOIs with the longest dwell time, first fixations and transitions as tooltip
+        self.aoi_summary = ""
+        self.aoi_label.setToolTip("")
+        aoi_index = self.eyetracking_overlay.aoi_index
+        if experiment_data is not None and experiment_data['fixations'] is not None and len(aoi_index) > 0:
+            metrics = AOIIndex.get_aoi_metrics(experiment_data, selected_condition, aoi_index)
+            names = metrics['names']
+
+            dwell_order = numpy.argsort(-metrics['dwell'])[:3]
+            self.aoi_summary = "Dwell time: " + ", ".join('%s %.1f s' % (names[i], metrics['dwell'][i] / 1000) for i in dwell_order if metrics['dwell'][i] > 0)
+
+            first_order = numpy.argsort(metrics['first_fixation'])[:5]
+            transitions = metrics['transitions']
+            transition_order = numpy.argsort(-transitions, axis=None)[:5]
+            self.aoi_label.setToolTip(
+                "First fixations: " + ", ".join('%s %.2f s' % (names[i], metrics['first_fixation'][i] / 1000) for i in first_order if numpy.isfinite(metrics['first_fixation'][i])) +
+                "\nTransitions: " + ", ".join('%s > %s (%s)' % (names[i // len(names)], names[i % len(names)], transitions.flat[i]) for i in transition_order if transitions.flat[i] > 0))
+
+        self.current_aoi = None
+        self.updateAOILabel()
 
     def setTime(self, time):
         self.eyetracking_overlay.setTime(time)
 
+        # the label only changes when another AOI is fixated
+        if self.eyetracking_overlay.currentAOI() != self.current_aoi:
+            self.updateAOILabel()
+
+    def updateAOILabel(self):
+        self.current_aoi = self.eyetracking_overlay.currentAOI()
+        current = self.eyetracking_overlay.aoi_index.names[self.current_aoi] if self.current_aoi >= 0 else "-"
+        self.aoi_label.setText("Fixated: " + current + ("  |  " + self.aoi_summary if self.aoi_summary else ""))
+
 
 class EyeTrackingOverlay(QtWidgets.QWidget):
     def __init__(self, main_window):
         QtWidgets.QWidget.__init__(self, main_window)
 
         self.condition_dataframe = None
+        self.fixations = None
+        self.aoi_index = AOIIndex.AOIIndex([], [], (0, 0))
+        self.aoi_samples = None
         self.image = None
+        self.original_size = None
+        self.heatmap = None
         self.scale_factor = None
 
         self.current_time = 0
@@ -49,13 +93,14 @@ class EyeTrackingOverlay(QtWidgets.QWidget):
         logging.debug('eyetracking view: calculated image height: %s', calculated_height)
         logging.debug('eyetracking view: image path: %s', imagePath)
 
-        self.image = QPixmap.fromImage(imagePath)
-        original_size = self.image.size()
+        # stimulus images are shared by all participants through the image cache
+        image_cache = ImageCache.get_image_cache()
+        self.original_size = image_cache.get_pixmap(imagePath).size()
 
-        self.image = self.image.scaledToWidth(calculated_width)
+        self.image = image_cache.get_scaled_pixmap(imagePath, calculated_width)
         scaled_size = self.image.size()
 
-        self.scale_factor = scaled_size.height() / original_size.height()
+        self.scale_factor = scaled_size.height() / self.original_size.height()
 
         self.setFixedWidth(calculated_width)
         self.setFixedHeight(calculated_height)
@@ -63,98 +108,154 @@ class EyeTrackingOverlay(QtWidgets.QWidget):
         self.current_time = 0
         self.update()
 
-    def setConditionDataframe(self, selected_condition, selected_condition_dataframe):
+    def setConditionDataframe(self, selected_condition, selected_condition_dataframe, experiment_data=None, heatmap_sources=None):
         self.condition_dataframe = selected_condition_dataframe
+        self.fixations = experiment_data['fixations'] if experiment_data is not None else None
+        trace_cache = experiment_data['signals'] if experiment_data is not None else None
         image_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'sample', 'images', selected_condition)
         self.setImage(self, image_path)
+        self.aoi_index = AOIIndex.get_aoi_index(image_path)
+
+        if config.EYETRACKING_DRAW_MODE == 'heatmap':
+            self.prepareHeatmap(selected_condition, heatmap_sources)
+
+        # traces are kept per participant (e.g., in a cohort), switching back to a condition does not prepare it again
+        key = ('eyetracking_trace', selected_condition, self.scale_factor)
+        if trace_cache is not None and key in trace_cache:
+            self.gaze_x, self.gaze_y, self.valid_mask, self.saccade_mask, self.fixation_rows, self.fixation_centroids, self.aoi_samples = trace_cache[key]
+            return
+
+        self.prepareTrace()
+        if trace_cache is not None:
+            trace_cache[key] = (self.gaze_x, self.gaze_y, self.valid_mask, self.saccade_mask, self.fixation_rows, self.fixation_centroids, self.aoi_samples)
+
+    def prepareHeatmap(self, selected_condition, heatmap_sources):
+        # stimulus and heatmap are composed once per condition, painting is a single blit then
+        density = GazeHeatmap.heatmap_density(heatmap_sources or [], selected_condition, (self.original_size.width(), self.original_size.height()))
+        heatmap_image = GazeHeatmap.heatmap_image(density, self.image.size())
+
+        self.heatmap = QtGui.QPixmap(self.image)
+        if heatmap_image is not None:
+            painter = QtGui.QPainter(self.heatmap)
+            painter.drawImage(0, 0, heatmap_image)
+            painter.end()
+
+    def prepareTrace(self):
+        # precompute the scaled gaze coordinates once per condition, painting then only slices these arrays
+        self.gaze_x = self.scale_factor * self.condition_dataframe['EyeTracking_X'].to_numpy(dtype=float)
+        self.gaze_y = self.scale_factor * self.condition_dataframe['EyeTracking_Y'].to_numpy(dtype=float)
+        self.valid_mask = numpy.isfinite(self.gaze_x) & numpy.isfinite(self.gaze_y)
+
+        # samples within a detected fixation event, everything else counts as saccade
+        self.aoi_samples = None
+        if self.fixations is not None:
+            fixation_index = FixationDetection.fixation_index(self.fixations, self.condition_dataframe['Time'].to_numpy(dtype=float))
+            fixation = fixation_index >= 0
+
+            # every sample of a fixation belongs to the AOI of the fixation's centroid (index -1 picks the appended -1)
+            fixation_aois = numpy.append(self.aoi_index.lookup(self.fixations['x'], self.fixations['y']), -1)
+            self.aoi_samples = fixation_aois[fixation_index]
+        else:
+            fixation = self.condition_dataframe['Gaze'].to_numpy(dtype=float) == 1
+
+            # without detected events, every run of fixation samples is one fixation
+            fixation_index = numpy.cumsum(~fixation)
+
+        self.saccade_mask = self.valid_mask & ~fixation
+        self.prepareFixationMarkers(fixation_index, self.valid_mask & fixation)
+
+    def prepareFixationMarkers(self, fixation_index, fixation_mask):
+        # first and last row of every fixation in this condition, one marker is drawn per fixation
+        rows = numpy.flatnonzero(fixation_mask)
+        starts = numpy.flatnonzero(numpy.diff(fixation_index[rows], prepend=-2) != 0)
+        ends = numpy.append(starts[1:], len(rows)) - 1
+        self.fixation_rows = numpy.column_stack((rows[starts], rows[ends]))
+
+        if self.fixations is not None:
+            events = fixation_index[rows[starts]]
+            self.fixation_centroids = self.scale_factor * numpy.column_stack((self.fixations['x'][events], self.fixations['y'][events])).astype(float)
+        elif len(rows) > 0:
+            counts = numpy.diff(numpy.append(starts, len(rows)))
+            self.fixation_centroids = numpy.column_stack((
+                numpy.add.reduceat(self.gaze_x[rows], starts) / counts,
+                numpy.add.reduceat(self.gaze_y[rows], starts) / counts
+            ))
+        else:
+            self.fixation_centroids = numpy.empty((0, 2))
 
     def setTime(self, time):
         self.current_time = time
         self.update()
 
+    def currentAOI(self):
+        # AOI fixated at the current time, -1 if none
+        if self.aoi_samples is None or not 0 <= self.current_time < len(self.aoi_samples):
+            return -1
+
+        return int(self.aoi_samples[self.current_time])
+
     def paintEvent(self, event):
         painter = QtGui.QPainter(self)
+        if config.EYETRACKING_DRAW_MODE == 'heatmap':
+            painter.drawPixmap(0, 0, self.heatmap)
+            return
+
         painter.drawPixmap(0, 0, self.image)
 
+        # highlight the currently fixated AOI (e.g., the code line)
+        current_aoi = self.currentAOI()
+        if current_aoi >= 0:
+            left, top, right, bottom = self.scale_factor * self.aoi_index.boxes[current_aoi]
+            painter.fillRect(QRectF(left, top, right - left, bottom - top), QColor(255, 255, 255, 40))
+
         if config.EYETRACKING_DRAW_MODE == 'saccades':
             self.drawSaccadesFixations(painter)
         else:
             self.drawGazePath(painter)
 
-    def drawSaccadesFixations(self, painter):
-        last_element = self.current_time
-
+    def traceWindow(self):
         # figure out which time frame to draw
-        if self.current_time > len(self.condition_dataframe):
-            last_element = len(self.condition_dataframe)
+        last_element = min(self.current_time, len(self.condition_dataframe))
 
         if self.current_time > config.EYETRACKING_LENGTH_TRACE:
             first_element = last_element - config.EYETRACKING_LENGTH_TRACE
         else:
             first_element = 0
 
-        self.fixations = self.condition_dataframe.loc[self.condition_dataframe['Gaze'] == 1]
-        self.saccades = self.condition_dataframe.loc[self.condition_dataframe['Gaze'] == 0]
+        return first_element, last_element
+
+    def tracePolygon(self, first_element, last_element, mask):
+        # polyline starting at the first sample of the window, followed by all samples selected by the mask
+        rows = first_element + numpy.flatnonzero(mask[first_element:last_element])
+
+        if first_element < len(self.valid_mask) and self.valid_mask[first_element]:
+            rows = numpy.insert(rows, 0, first_element)
+
+        return QPolygonF(list(map(QPointF, self.gaze_x[rows].tolist(), self.gaze_y[rows].tolist())))
+
+    def drawSaccadesFixations(self, painter):
+        first_element, last_element = self.traceWindow()
 
         # draw saccades
         saccade_color = QColor('yellow')
         saccade_pen = QtGui.QPen(saccade_color)
         painter.setPen(saccade_pen)
+        painter.drawPolyline(self.tracePolygon(first_element, last_element, self.saccade_mask))
 
-        path = QtGui.QPainterPath()
-        path.moveTo(
-            self.scale_factor * self.condition_dataframe['EyeTracking_X'][first_element],
-            self.scale_factor * self.condition_dataframe['EyeTracking_Y'][first_element]
-        )
-
-        for i in range(first_element, last_element):
-            if self.saccades.index.contains(i):
-                path.lineTo(
-                    self.scale_factor * self.saccades['EyeTracking_X'][i],
-                    self.scale_factor * self.saccades['EyeTracking_Y'][i]
-                )
-        painter.drawPath(path)
-
-        # draw fixations
+        # draw fixations, one marker at the centroid of every fixation overlapping the window
         fixation_color = QColor('green')
         fixation_pen = QtGui.QPen(fixation_color)
         painter.setPen(fixation_pen)
 
-        for i in range(first_element, last_element):
-            if self.fixations.index.contains(i):
-                painter.drawEllipse(
-                    self.scale_factor * self.fixations['EyeTracking_X'][i],
-                    self.scale_factor * self.fixations['EyeTracking_Y'][i],
-                    15,
-                    15
-                )
+        first_fixation = numpy.searchsorted(self.fixation_rows[:, 1], first_element)
+        last_fixation = numpy.searchsorted(self.fixation_rows[:, 0], last_element)
+        for x, y in self.fixation_centroids[first_fixation:last_fixation].tolist():
+            painter.drawEllipse(QRectF(x, y, 15, 15))
 
     def drawGazePath(self, painter):
         color = QColor('yellow')
         pen = QtGui.QPen(color)
         painter.setPen(pen)
 
-        path = QtGui.QPainterPath()
-
-        last_element = self.current_time
-
-        # figure out which time frame to draw
-        if self.current_time > len(self.condition_dataframe):
-            last_element = len(self.condition_dataframe)
-
-        if self.current_time > config.EYETRACKING_LENGTH_TRACE:
-            first_element = last_element - config.EYETRACKING_LENGTH_TRACE
-        else:
-            first_element = 0
-
-        path.moveTo(
-            self.scale_factor * self.condition_dataframe['EyeTracking_X'][first_element],
-            self.scale_factor * self.condition_dataframe['EyeTracking_Y'][first_element]
-        )
-
-        for i in range(first_element, last_element):
-            path.lineTo(
-                self.scale_factor * self.condition_dataframe['EyeTracking_X'][i],
-                self.scale_factor * self.condition_dataframe['EyeTracking_Y'][i]
-            )
-        painter.drawPath(path)
+        first_element, last_element = self.traceWindow()
+        painter.drawPolyline(self.tracePolygon(first_element, last_element, self.valid_mask))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+import logging
+import time
+
+import numpy
+
+from codersmuse import config
+
+# one row per fixation: start and (exclusive) end in Time units, centroid in pixels and duration in milliseconds
+FIXATION_DTYPE = numpy.dtype([('start', 'f8'), ('end', 'f8'), ('x', 'f4'), ('y', 'f4'), ('duration', 'f4')])
+
+
+def detect_fixations(times, gaze_x, gaze_y, method='ivt', gaze=None):
+    # classify the raw samples of one recording, all detectors only use array operations
+    times = numpy.asarray(times, dtype=float)
+    gaze_x = numpy.asarray(gaze_x, dtype=float)
+    gaze_y = numpy.asarray(gaze_y, dtype=float)
+
+    if method == 'ivt':
+        fixation_samples = velocity_threshold_samples(times, gaze_x, gaze_y, config.EYETRACKING_VELOCITY_THRESHOLD)
+    elif method == 'idt':
+        fixation_samples = dispersion_threshold_samples(times, gaze_x, gaze_y, config.EYETRACKING_DISPERSION_THRESHOLD, config.EYETRACKING_MIN_FIXATION_DURATION)
+    elif method == 'gaze':
+        # classification of the input file (1 = fixation)
+        fixation_samples = numpy.asarray(gaze, dtype=float) == 1
+    else:
+        raise ValueError('unknown fixation detection method: %s' % method)
+
+    events = fixation_events(times, gaze_x, gaze_y, fixation_samples)
+
+    # the classification of the input file is kept as it is
+    if method != 'gaze':
+        events = events[events['duration'] >= config.EYETRACKING_MIN_FIXATION_DURATION]
+
+    return events
+
+
+def velocity_threshold_samples(times, gaze_x, gaze_y, velocity_threshold):
+    # I-VT: a sample belongs to a fixation if the gaze moved slower than the threshold (pixels per second) since the previous sample
+    if len(times) < 2:
+        return numpy.zeros(len(times), dtype=bool)
+
+    seconds = numpy.diff(times) / config.DATA_RESOLUTION
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        velocity = numpy.hypot(numpy.diff(gaze_x), numpy.diff(gaze_y)) / seconds
+
+    # the first sample gets the velocity towards the second one, missing samples compare False
+    velocity = numpy.concatenate((velocity[:1], velocity))
+    with numpy.errstate(invalid='ignore'):
+        return velocity < velocity_threshold
+
+
+def dispersion_threshold_samples(times, gaze_x, gaze_y, dispersion_threshold, min_duration):
+    # I-DT: every window of the minimum fixation duration with a dispersion (x range + y range) below the threshold
+    # is part of a fixation, overlapping windows are joined instead of growing each window one sample at a time
+    period = numpy.median(numpy.diff(times)) if len(times) > 1 else 1.0
+    window = max(int(round(min_duration / 1000 * config.DATA_RESOLUTION / period)), 1)
+    if len(times) < window:
+        return numpy.zeros(len(times), dtype=bool)
+
+    dispersion = (sliding_maximum(gaze_x, window) - sliding_minimum(gaze_x, window)) + (sliding_maximum(gaze_y, window) - sliding_minimum(gaze_y, window))
+    with numpy.errstate(invalid='ignore'):
+        window_starts = (dispersion <= dispersion_threshold).astype(numpy.int32)
+
+    # a sample is covered if any of the windows starting within the preceding window length qualifies
+    covered = numpy.cumsum(numpy.concatenate((window_starts, numpy.zeros(window - 1, dtype=numpy.int32))))
+    covered[window:] -= covered[:-window].copy()
+
+    return covered > 0
+
+
+def sliding_maximum(values, window):
+    # maximum of values[i:i + window] for every full window in O(n) (van Herk/Gil-Werman), missing values propagate
+    padding = -len(values) % window
+    blocks = numpy.concatenate((values, numpy.full(padding, numpy.nan))).reshape(-1, window)
+
+    prefix = numpy.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = numpy.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    count = len(values) - window + 1
+    return numpy.maximum(suffix[:count], prefix[window - 1:window - 1 + count])
+
+
+def sliding_minimum(values, window):
+    return -sliding_maximum(-values, window)
+
+
+def fixation_events(times, gaze_x, gaze_y, fixation_samples):
+    # contiguous runs of fixation samples, centroids through cumulative sums instead of a loop over the events
+    fixation_samples = fixation_samples & numpy.isfinite(gaze_x) & numpy.isfinite(gaze_y)
+
+    edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], fixation_samples.astype(numpy.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+
+    sum_x = numpy.concatenate(([0], numpy.cumsum(numpy.where(fixation_samples, gaze_x, 0))))
+    sum_y = numpy.concatenate(([0], numpy.cumsum(numpy.where(fixation_samples, gaze_y, 0))))
+
+    # a fixation lasts until the sample after its last one is expected
+    period = numpy.median(numpy.diff(times)) if len(times) > 1 else 1.0
+
+    events = numpy.empty(len(starts), dtype=FIXATION_DTYPE)
+    events['start'] = times[starts]
+    events['end'] = times[ends - 1] + period
+    events['x'] = (sum_x[ends] - sum_x[starts]) / (ends - starts)
+    events['y'] = (sum_y[ends] - sum_y[starts]) / (ends - starts)
+    events['duration'] = (events['end'] - events['start']) * 1000 / config.DATA_RESOLUTION
+
+    return events
+
+
+def fixation_mask(events, times):
+    # True for all times within a fixation
+    return fixation_index(events, times) >= 0
+
+
+def fixation_index(events, times):
+    # the fixation event of every time, -1 for times outside of all fixations
+    times = numpy.asarray(times, dtype=float)
+    position = numpy.searchsorted(events['start'], times, side='right') - 1
+
+    within = position >= 0
+    within[within] = times[within] < events['end'][position[within]]
+    position[~within] = -1
+
+    return position
+
+
+def simulate_gaze(seconds, sampling_rate):
+    # fixations of 100-500 ms at random screen positions with some jitter, connected by 30 ms saccades
+    random = numpy.random.default_rng(0)
+    sample_count = int(seconds * sampling_rate)
+    times = numpy.arange(sample_count) * config.DATA_RESOLUTION / sampling_rate
+
+    durations = random.integers(int(0.1 * sampling_rate), int(0.5 * sampling_rate), size=sample_count // int(0.1 * sampling_rate))
+    boundaries = numpy.cumsum(durations)
+    boundaries = boundaries[boundaries < sample_count]
+    targets = random.uniform(0, 1000, size=(len(boundaries) + 1, 2))
+
+    fixation = numpy.searchsorted(boundaries, numpy.arange(sample_count), side='right')
+    gaze = targets[fixation] + random.normal(0, 0.2, size=(sample_count, 2))
+
+    # saccades: linear movement towards the next target during the first 30 ms of every fixation
+    saccade_length = int(0.03 * sampling_rate)
+    since_boundary = numpy.arange(sample_count) - numpy.concatenate(([0], boundaries))[fixation]
+    saccade = (since_boundary < saccade_length) & (fixation > 0)
+    progress = (since_boundary[saccade] / saccade_length)[:, None]
+    gaze[saccade] = targets[fixation[saccade] - 1] * (1 - progress) + targets[fixation[saccade]] * progress
+
+    return times, gaze[:, 0], gaze[:, 1], len(boundaries) + 1
+
+
+if __name__ == "__main__":
+    # benchmark: one hour of 1000 Hz gaze data
+    logging.basicConfig(level=logging.INFO)
+    times, gaze_x, gaze_y, fixation_count = simulate_gaze(3600, 1000)
+    logging.info('benchmark: %s samples, %s simulated fixations', len(times), fixation_count)
+
+    for method in ('ivt', 'idt'):
+        started = time.perf_counter()
+        events = detect_fixations(times, gaze_x, gaze_y, method)
+        logging.info('benchmark: %s found %s fixations in %.2f s (mean duration %.0f ms)', method, len(events), time.perf_counter() - started, events['duration'].mean())
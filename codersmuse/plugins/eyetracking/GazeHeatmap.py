@@ -0,0 +1,76 @@
+import math
+
+import numpy
+from PySide2 import QtGui
+from PySide2.QtCore import Qt
+from scipy import ndimage
+
+from codersmuse import config, ConditionSegments
+from codersmuse.plugins.eyetracking import FixationDetection
+
+# colormap from transparent blue over green and yellow to opaque red, as ARGB lookup table
+HEATMAP_COLOR_STOPS = [
+    # level, alpha, red, green, blue
+    (0, 0, 0, 0, 255),
+    (40, 90, 0, 128, 255),
+    (110, 140, 0, 255, 64),
+    (180, 170, 255, 255, 0),
+    (255, 200, 255, 0, 0)
+]
+
+
+def _color_table():
+    stops = numpy.array(HEATMAP_COLOR_STOPS, dtype=float)
+    channels = [numpy.interp(numpy.arange(256), stops[:, 0], stops[:, i]).astype(numpy.uint32) for i in range(1, 5)]
+    return (channels[0] << 24) | (channels[1] << 16) | (channels[2] << 8) | channels[3]
+
+
+HEATMAP_COLORS = _color_table()
+
+
+def get_histogram(experiment_data, condition, image_size):
+    # fixation samples of one participant on the downscaled stimulus grid, cached with the participant's other derived signals
+    key = ('heatmap', condition, image_size, config.EYETRACKING_HEATMAP_CELL_SIZE)
+    if key in experiment_data['signals']:
+        return experiment_data['signals'][key]
+
+    condition_dataframe = ConditionSegments.get_condition_dataframe(experiment_data, condition)
+    gaze_x = condition_dataframe['EyeTracking_X'].to_numpy(dtype=float)
+    gaze_y = condition_dataframe['EyeTracking_Y'].to_numpy(dtype=float)
+
+    if experiment_data.get('fixations') is not None:
+        fixation = FixationDetection.fixation_mask(experiment_data['fixations'], condition_dataframe['Time'].to_numpy(dtype=float))
+    else:
+        fixation = condition_dataframe['Gaze'].to_numpy(dtype=float) == 1
+    fixation &= numpy.isfinite(gaze_x) & numpy.isfinite(gaze_y)
+
+    # one sample per hundredth of a second, so the counts are proportional to the dwell time
+    width, height = image_size
+    cell_size = config.EYETRACKING_HEATMAP_CELL_SIZE
+    histogram, _, _ = numpy.histogram2d(gaze_y[fixation], gaze_x[fixation],
+                                        bins=(math.ceil(height / cell_size), math.ceil(width / cell_size)), range=((0, height), (0, width)))
+
+    experiment_data['signals'][key] = histogram.astype(numpy.float32)
+    return experiment_data['signals'][key]
+
+
+def heatmap_density(sources, condition, image_size):
+    # summed over all participants (e.g., of a cohort) that saw the condition, smoothing is linear, so the sum is only smoothed once
+    histograms = [get_histogram(experiment_data, condition, image_size) for experiment_data in sources if condition in experiment_data['segments']]
+    if not histograms:
+        return None
+
+    return ndimage.gaussian_filter(numpy.sum(histograms, axis=0), sigma=config.EYETRACKING_HEATMAP_SIGMA / config.EYETRACKING_HEATMAP_CELL_SIZE)
+
+
+def heatmap_image(density, size):
+    # colored heatmap with alpha, scaled to the size of the shown stimulus
+    if density is None or density.max() <= 0:
+        return None
+
+    levels = (density * (255 / density.max())).astype(numpy.uint8)
+    pixels = numpy.ascontiguousarray(HEATMAP_COLORS[levels])
+    height, width = pixels.shape
+
+    image = QtGui.QImage(pixels.data, width, height, width * 4, QtGui.QImage.Format_ARGB32)
+    return image.scaled(size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
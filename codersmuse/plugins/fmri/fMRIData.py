@@ -3,114 +3,208 @@ import math
 import os
 
 import matplotlib.pyplot as plt
-import nibabel
 import numpy
+import pandas as pd
 from nilearn import plotting
 
-from codersmuse import config
+from codersmuse import config, ConditionSegments, RenderCache, RenderPool, SessionCache
+from codersmuse.plugins.fmri import fMRIRois, fMRIVolumes
 
-OVERWRITE_ROI_PLOTS = False
-OVERWRITE_EPI_PLOTS = False
-MAXIMUM_EPI_PLOTS = 75
+# the Average column of the precomputed ROI files is the signal of this ROI
+ROI_FILE_NAME = 'BA6'
 
 
-def preprocess_fmri_fullbrain(experiment_data):
+def preprocess_fmri_fullbrain(experiment_data, progress_callback=None):
     # prepare the full-brain fMRI activation plots
     # http://nilearn.github.io/plotting/index.html
-    fmri_data = nibabel.load(experiment_data['nifti_path'])
-    fmri_data_slices = nibabel.four_to_three(fmri_data)
-    for i in range(MAXIMUM_EPI_PLOTS):
-        output_file_cond = os.path.join(os.path.dirname(__file__), '..', '..', 'temp', 'fmri', experiment_data['participant'] + '_fMRIfull_' + str(i) + '.png')
+    # live slices do not need preprocessed images
+    if config.FMRI_FULLBRAIN_MODE == 'slices':
+        return True
 
-        # TODO make the cut slice configurable directly from the UI
-        if OVERWRITE_EPI_PLOTS or not os.path.exists(output_file_cond):
-            plotting.plot_img(
-                fmri_data_slices[i],
-                output_file=output_file_cond,
-                title='Scan ' + str(i),
-                cut_coords=(config.FMRI_CUT_SLICE_X, config.FMRI_CUT_SLICE_Y, config.FMRI_CUT_SLICE_Z),
-                annotate=True,
-                draw_cross=True,
-                black_bg=True,
-                cmap=plt.cm.nipy_spectral)
+    scan_count = fMRIVolumes.open_volumes(experiment_data['nifti_path']).scan_count
+    nifti_fingerprint = SessionCache.file_fingerprint(experiment_data['nifti_path'])
+    cut_coords = (config.FMRI_CUT_SLICE_X, config.FMRI_CUT_SLICE_Y, config.FMRI_CUT_SLICE_Z)
 
+    frames = {}
+    jobs = []
+    for i in range(scan_count):
+        key = RenderCache.render_key('fMRIfull', nifti=nifti_fingerprint, scan=i, cut_coords=cut_coords)
+        frames[i] = RenderCache.lookup(key)
 
-def preprocess_fMRI_ROI(experiment_data):
-    for condition in experiment_data['conditions']:
-        condition_dataframe = experiment_data['dataframe'][experiment_data['dataframe']['Condition'] == condition]
+        if frames[i] is None:
+            frames[i] = RenderCache.cache_path(key)
+            jobs.append({
+                'nifti_path': experiment_data['nifti_path'],
+                'scan': i,
+                'output_file': frames[i],
+                'cut_coords': cut_coords
+            })
 
-        logging.info('Preprocessing fMRI ROI data for condition: %s', condition)
+    experiment_data['render_frames']['fMRIfull'] = frames
 
-        # TODO smarter check whether files already exist and whether to overwrite them
-        if not OVERWRITE_ROI_PLOTS:
-            logging.info('--> use preprocessed files')
-            continue
+    logging.info('rendering %s of %s full-brain fMRI plots', len(jobs), scan_count)
+    completed = RenderPool.render_all(render_fullbrain_scan, jobs, progress_callback)
+    RenderCache.evict()
+    RenderCache.log_statistics()
 
-        # cycle through all physio data types
-        condition_start_pos = condition_dataframe['Time'].iloc[0]
-        condition_end_pos = condition_dataframe['Time'].iloc[-1]
-        condition_dataframe.reset_index(inplace=True, drop=True)
+    return completed
 
-        draw_fMRI_ROI(experiment_data, 'BA6', condition_start_pos, condition_end_pos)
 
+def render_fullbrain_scan(nifti_path, scan, output_file, cut_coords):
+    # runs in a worker process, only needs to read its own scan from the 4D volume
+    plt.switch_backend('Agg')
 
-def draw_fMRI_ROI(experiment_data, roi, start_pos, end_pos, span=15, highlight_span=0.5):
-    roi_data = experiment_data['fmri']['Average']
+    display = plotting.plot_img(
+        fMRIVolumes.open_volumes(nifti_path).get_image(scan),
+        title='Scan ' + str(scan),
+        cut_coords=cut_coords,
+        annotate=True,
+        draw_cross=True,
+        black_bg=True,
+        cmap=plt.cm.nipy_spectral)
 
-    start_pos = math.floor((start_pos / 100) * config.FMRI_RESOLUTION)
-    end_pos = math.ceil((end_pos / 100) * config.FMRI_RESOLUTION)
+    RenderPool.save_figure_atomic(display, output_file)
+    display.close()
+
+
+def preprocess_fMRI_ROI(experiment_data, progress_callback=None):
+    experiment_data['fmri'] = load_roi_signals(experiment_data, progress_callback)
+    if experiment_data['fmri'] is None:
+        return False
+
+    rois = [roi for roi in experiment_data['fmri'].columns if config.FMRI_ROI_PLOTS is None or roi in config.FMRI_ROI_PLOTS]
+    experiment_data['fmri_rois'] = rois
+
+    jobs = []
+    frame_count = 0
+    for roi in rois:
+        frames = {}
+        for condition in experiment_data['conditions']:
+            logging.info('Preprocessing fMRI ROI data for condition: %s (%s)', condition, roi)
+
+            condition_start_pos, condition_end_pos = ConditionSegments.get_condition_times(experiment_data, condition)
+
+            jobs.extend(draw_fMRI_ROI(experiment_data, roi, condition_start_pos, condition_end_pos, frames))
+
+        experiment_data['render_frames'][('ROI', roi)] = frames
+        frame_count += len(frames)
+
+    logging.info('rendering %s of %s fMRI ROI plots', len(jobs), frame_count)
+    completed = RenderPool.render_all(render_roi_frame, jobs, progress_callback)
+    RenderCache.evict()
+    RenderCache.log_statistics()
+
+    return completed
+
+
+def load_roi_signals(experiment_data, progress_callback=None):
+    # one column per ROI and one row per scan, None if cancelled
+    if config.FMRI_ROI_ATLAS or config.FMRI_ROI_MASKS:
+        roi_signals = fMRIRois.get_roi_signals(experiment_data['nifti_path'], progress_callback)
+        if roi_signals is None:
+            return None
 
-    plt.figure(figsize=(8, 3), dpi=80)
+        names, signals = roi_signals
+        return pd.DataFrame(numpy.asarray(signals, dtype=float).T, columns=names)
 
-    current_time = start_pos
+    if not experiment_data['roi_path'] or not os.path.exists(experiment_data['roi_path']):
+        logging.info('fMRI ROIs: neither ROI images nor a ROI file are available')
+        return pd.DataFrame()
+
+    # precomputed ROI averages (scan;Average), as exported for the sample data
+    # TODO change both input csv files to , separated files
+    roi_file = pd.read_csv(experiment_data['roi_path'], sep=';')
+    return roi_file.drop(columns=['scan'], errors='ignore').rename(columns={'Average': ROI_FILE_NAME})
+
+
+def draw_fMRI_ROI(experiment_data, roi, start_pos, end_pos, frames, span=15, highlight_span=0.5):
+    # collect one render job per scan within one condition, unless the same plot is cached already
+    roi_data = experiment_data['fmri'][roi].to_numpy(dtype=float)
+    y_limits = (numpy.nanmin(roi_data), numpy.nanmax(roi_data))
+
+    start_pos = math.floor((start_pos / 100) * config.FMRI_RESOLUTION)
+    end_pos = math.ceil((end_pos / 100) * config.FMRI_RESOLUTION)
 
     logging.info('drawing ROI plot, start pos %s', start_pos)
     logging.info('drawing ROI plot, end pos %s', end_pos)
 
+    jobs = []
     for i in range(end_pos - start_pos):
-        # draw one plot per second for each frame within one condition
-        plt.clf()
-
         current_time = start_pos + i
 
-        logging.info('drawing ROI plot for %s', current_time)
+        # only the visible part of the ROI signal goes into the key
+        key = RenderCache.render_key(
+            'ROI',
+            roi=roi,
+            roi_data=roi_data[max(current_time - span, 0):current_time + span],
+            y_limits=y_limits,
+            start_pos=start_pos,
+            end_pos=end_pos,
+            current_time=current_time,
+            span=span,
+            highlight_span=highlight_span,
+            delay=config.FMRI_DELAY)
+        frames[current_time] = RenderCache.lookup(key)
+
+        if frames[current_time] is None:
+            frames[current_time] = RenderCache.cache_path(key)
+            jobs.append({
+                'roi_data': roi_data,
+                'y_limits': y_limits,
+                'start_pos': start_pos,
+                'end_pos': end_pos,
+                'current_time': current_time,
+                'output_file': frames[current_time],
+                'span': span,
+                'highlight_span': highlight_span
+            })
+
+    return jobs
+
+
+def render_roi_frame(roi_data, y_limits, start_pos, end_pos, current_time, output_file, span, highlight_span):
+    # draw one plot per scan, runs in a worker process
+    plt.switch_backend('Agg')
+    figure = plt.figure(figsize=(8, 3), dpi=80)
+
+    logging.info('drawing ROI plot for %s', current_time)
 
-        minimum = current_time - span
-        maximum = current_time + span
-        if minimum < 0:
-            minimum = 0
+    minimum = current_time - span
+    maximum = current_time + span
+    if minimum < 0:
+        minimum = 0
 
-        plot_y_values = roi_data[minimum:maximum]
-        y_values_mask = numpy.isfinite(plot_y_values)
+    plot_y_values = roi_data[minimum:maximum]
+    y_values_mask = numpy.isfinite(plot_y_values)
 
-        if len(plot_y_values) < (maximum - minimum):
-            maximum = len(plot_y_values) + minimum
+    if len(plot_y_values) < (maximum - minimum):
+        maximum = len(plot_y_values) + minimum
 
-        x_axis = numpy.arange(minimum, maximum, 1)
+    x_axis = numpy.arange(minimum, maximum, 1)
 
-        plt.plot(x_axis[y_values_mask], plot_y_values[y_values_mask])
+    plt.plot(x_axis[y_values_mask], plot_y_values[y_values_mask])
 
-        # todo evaluate adding a horizontal line for average condition and/or average of entire session
+    # todo evaluate adding a horizontal line for average condition and/or average of entire session
 
-        # add backgrounds for condition visualization
-        task_start = minimum
-        if start_pos > minimum:
-            task_start = start_pos
+    # add backgrounds for condition visualization
+    task_start = minimum
+    if start_pos > minimum:
+        task_start = start_pos
 
-        task_end = maximum
-        if maximum > end_pos:
-            task_end = end_pos
+    task_end = maximum
+    if maximum > end_pos:
+        task_end = end_pos
 
-        plt.axvspan(task_start, task_end, color='blue', alpha=0.05)
+    plt.axvspan(task_start, task_end, color='blue', alpha=0.05)
 
-        # highlight current time
-        plt.axvspan(current_time - highlight_span, current_time + highlight_span, color='grey', alpha=0.2)
+    # highlight current time
+    plt.axvspan(current_time - highlight_span, current_time + highlight_span, color='grey', alpha=0.2)
 
-        # highlight shifted time
-        plt.axvspan(config.FMRI_DELAY + current_time - highlight_span, config.FMRI_DELAY + current_time + highlight_span, color='red', alpha=0.2)
+    # highlight shifted time
+    plt.axvspan(config.FMRI_DELAY + current_time - highlight_span, config.FMRI_DELAY + current_time + highlight_span, color='red', alpha=0.2)
 
-        plt.gca().set_ylim(min(roi_data), max(roi_data))
+    plt.gca().set_ylim(*y_limits)
 
-        # save plot as pngs
-        file_name = experiment_data['participant'] + '_ROI_' + str(current_time) + '.png'
-        plt.savefig(os.path.join('temp', 'fmri', file_name), bbox_inches='tight')
+    # save plot as pngs
+    RenderPool.save_figure_atomic(figure, output_file, bbox_inches='tight')
+    plt.close(figure)
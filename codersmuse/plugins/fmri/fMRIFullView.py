@@ -1,10 +1,10 @@
 import logging
-import os
 
 from PySide2 import QtGui
 from PySide2.QtWidgets import QLabel
 
-from codersmuse import config
+from codersmuse import config, ImageCache
+from codersmuse.plugins.fmri import fMRISliceView, fMRIVolumes
 
 
 class fMRIFullView:
@@ -12,20 +12,28 @@ class fMRIFullView:
         self.title = QLabel("fMRI Data: Full Brain")
         self.shift_label = QLabel("Highlighted area in red is shifted forward by " + str(config.FMRI_DELAY) + " seconds (" + str(int(config.FMRI_DELAY * config.FMRI_RESOLUTION)) + " scans)")
         self.full_brain_image = QLabel("")
+        self.slice_view = fMRISliceView.fMRISliceView() if config.FMRI_FULLBRAIN_MODE == 'slices' else None
 
     def create_view(self, parent_layout, experiment_data):
         self.title.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
         parent_layout.addWidget(self.title)
         parent_layout.addWidget(self.shift_label)
 
-        self.full_brain_image.setPixmap(QtGui.QPixmap(os.path.join('temp', 'fmri', experiment_data['participant'] + '_fMRIfull_0.png')))
-        self.full_brain_image.show()
+        self.update_data(experiment_data, 0)
 
-        parent_layout.addWidget(self.full_brain_image)
+        parent_layout.addWidget(self.slice_view or self.full_brain_image)
 
     def update_data(self, experiment_data, shifted_scan):
-        scan_image = os.path.join('temp', 'fmri', experiment_data['participant'] + '_fMRIfull_' + str(shifted_scan) + '.png')
+        if self.slice_view is not None:
+            self.slice_view.set_volumes(fMRIVolumes.open_volumes(experiment_data['nifti_path']))
+            self.slice_view.set_scan(shifted_scan)
+            return
+
+        frames = experiment_data['render_frames'].get('fMRIfull', {})
+        scan_image = frames.get(shifted_scan)
         logging.info('showing fMRI full-brain data: current scan: %s', scan_image)
 
-        self.full_brain_image.setPixmap(QtGui.QPixmap(scan_image))
+        image_cache = ImageCache.get_image_cache()
+        self.full_brain_image.setPixmap(image_cache.get_pixmap(scan_image))
+        image_cache.prefetch(frames.get(shifted_scan + i) for i in range(1, config.IMAGE_PREFETCH_FRAMES + 1))
         self.full_brain_image.show()
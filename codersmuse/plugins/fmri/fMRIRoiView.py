@@ -1,33 +1,66 @@
 import logging
-import os
 
 from PySide2 import QtGui
-from PySide2.QtWidgets import QLabel
+from PySide2.QtWidgets import QLabel, QComboBox, QHBoxLayout
 
-from codersmuse import config
+from codersmuse import config, ImageCache
 
 
 class fMRIRoiView():
     def __init__(self):
-        self.title = QLabel("fMRI Data: ROI BA6")
+        self.title = QLabel("fMRI Data: ROI")
+        self.roi_selection_box = QComboBox()
         self.shift_label = QLabel("Highlighted area in red is shifted forward by " + str(config.FMRI_DELAY) + " seconds (" + str(int(config.FMRI_DELAY * config.FMRI_RESOLUTION)) + " scans)")
         self.roi_plot = QLabel("")
 
+        self.roi = None
+        self.experiment_data = None
+        self.current_scan = 0
+
     def create_view(self, parent_layout, experiment_data):
         self.title.setFont(QtGui.QFont("Times", 16, QtGui.QFont.Bold))
-        parent_layout.addWidget(self.title)
-        parent_layout.addWidget(self.shift_label)
+        self.roi_selection_box.setFont(QtGui.QFont("Times", 14, QtGui.QFont.Normal))
+        self.roi_selection_box.currentTextChanged.connect(self.roi_changed)
 
-        plot_path = os.path.join('temp', 'fmri', experiment_data['participant'] + '_ROI_0.png')
-        logging.info('fMRI plot path: %s', plot_path)
+        title_layout = QHBoxLayout()
+        title_layout.addWidget(self.title)
+        title_layout.addWidget(self.roi_selection_box)
+        title_layout.addStretch()
+        parent_layout.addLayout(title_layout)
+        parent_layout.addWidget(self.shift_label)
 
-        self.roi_plot.setPixmap(QtGui.QPixmap(plot_path))
-        self.roi_plot.show()
+        self.update_data(experiment_data, 0)
         parent_layout.addWidget(self.roi_plot)
 
+    def set_rois(self, rois):
+        # ROIs may differ between the participants of a cohort, the selected one is kept if possible
+        if rois == [self.roi_selection_box.itemText(i) for i in range(self.roi_selection_box.count())]:
+            return
+
+        self.roi_selection_box.blockSignals(True)
+        self.roi_selection_box.clear()
+        self.roi_selection_box.addItems(rois)
+        if self.roi in rois:
+            self.roi_selection_box.setCurrentText(self.roi)
+        self.roi_selection_box.blockSignals(False)
+
+        self.roi = self.roi_selection_box.currentText() or None
+
+    def roi_changed(self, roi):
+        self.roi = roi
+        if self.experiment_data is not None:
+            self.update_data(self.experiment_data, self.current_scan)
+
     def update_data(self, experiment_data, current_scan):
-        plot_path = os.path.join('temp', 'fmri', experiment_data['participant'] + '_ROI_' + str(current_scan) + '.png')
+        self.experiment_data = experiment_data
+        self.current_scan = current_scan
+        self.set_rois(experiment_data['fmri_rois'])
+
+        frames = experiment_data['render_frames'].get(('ROI', self.roi), {})
+        plot_path = frames.get(current_scan)
         logging.info('fMRI plot path: %s', plot_path)
 
-        self.roi_plot.setPixmap(QtGui.QPixmap(plot_path))
+        image_cache = ImageCache.get_image_cache()
+        self.roi_plot.setPixmap(image_cache.get_pixmap(plot_path))
+        image_cache.prefetch(frames.get(current_scan + i) for i in range(1, config.IMAGE_PREFETCH_FRAMES + 1))
         self.roi_plot.show()
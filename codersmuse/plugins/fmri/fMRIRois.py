@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+
+import nibabel
+import numpy
+import pandas as pd
+
+from codersmuse import config, SessionCache
+from codersmuse.plugins.fmri import fMRIVolumes
+
+# e.g., atlas.csv next to atlas.nii(.gz), with the columns Label,Name
+LABEL_FILE_SUFFIX = '.csv'
+
+
+class RoiParcels:
+    """Configured ROIs (atlas labels and binary masks) split into disjoint parcels of voxels that belong to the same ROIs.
+
+    The mean of every ROI in a scan is then a single reduction over the parcels and a small parcel-to-ROI product, also when ROIs overlap."""
+
+    def __init__(self, names, voxels, parcel_starts, membership):
+        self.names = list(names)
+        self.voxels = voxels  # flat voxel indices, sorted by parcel
+        self.parcel_starts = parcel_starts
+        self.membership = membership  # parcels x ROIs
+
+    def __len__(self):
+        return len(self.names)
+
+    def means(self, volumes):
+        # ROI x scan means of a block of scans, given as voxels x scans
+        values = volumes[self.voxels]
+        finite = numpy.isfinite(values)
+
+        sums = numpy.add.reduceat(numpy.where(finite, values, 0), self.parcel_starts, axis=0)
+        counts = numpy.add.reduceat(finite, self.parcel_starts, axis=0)
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return (self.membership.T @ sums) / (self.membership.T @ counts)
+
+
+def roi_settings():
+    # everything the extracted signals depend on besides the scans
+    return {
+        'atlas': SessionCache.file_fingerprint(config.FMRI_ROI_ATLAS) if config.FMRI_ROI_ATLAS else None,
+        'masks': {name: SessionCache.file_fingerprint(path) for name, path in config.FMRI_ROI_MASKS.items()}
+    }
+
+
+def read_labels(path, shape):
+    labels = numpy.asanyarray(nibabel.load(path).dataobj)
+    if labels.shape[:3] != tuple(shape[:3]):
+        raise ValueError('ROI image %s has shape %s, the scans have %s' % (path, labels.shape, shape[:3]))
+
+    return numpy.rint(labels.reshape(shape[:3])).astype(numpy.int64).ravel()
+
+
+def atlas_names(atlas_path, labels):
+    label_path = atlas_path[:-len('.gz')] if atlas_path.endswith('.gz') else atlas_path
+    label_path = os.path.splitext(label_path)[0] + LABEL_FILE_SUFFIX
+    if not os.path.exists(label_path):
+        return ['label %s' % label for label in labels]
+
+    label_names = pd.read_csv(label_path, sep=',')
+    label_names = dict(zip(label_names['Label'].astype(int), label_names['Name'].astype(str)))
+    return [label_names.get(label, 'label %s' % label) for label in labels]
+
+
+def load_parcels(shape):
+    # every voxel gets a key of its atlas label (index) and mask bits, voxels with the same key form a parcel
+    mask_count = len(config.FMRI_ROI_MASKS)
+    keys = numpy.zeros(int(numpy.prod(shape[:3])), dtype=numpy.int64)
+    names = []
+
+    atlas_labels = numpy.empty(0, dtype=numpy.int64)
+    if config.FMRI_ROI_ATLAS:
+        labels = read_labels(config.FMRI_ROI_ATLAS, shape)
+        atlas_labels = numpy.unique(labels[labels > 0])
+        names += atlas_names(config.FMRI_ROI_ATLAS, atlas_labels)
+
+        atlas_index = numpy.where(labels > 0, numpy.searchsorted(atlas_labels, labels) + 1, 0)
+        keys |= atlas_index << mask_count
+
+    for bit, (name, path) in enumerate(config.FMRI_ROI_MASKS.items()):
+        keys |= (read_labels(path, shape) > 0).astype(numpy.int64) << bit
+        names.append(name)
+
+    voxels = numpy.flatnonzero(keys)
+    parcel_keys, parcels = numpy.unique(keys[voxels], return_inverse=True)
+    order = numpy.argsort(parcels, kind='stable')
+    parcel_starts = numpy.searchsorted(parcels[order], numpy.arange(len(parcel_keys)))
+
+    membership = numpy.zeros((len(parcel_keys), len(names)))
+    atlas_index = parcel_keys >> mask_count
+    in_atlas = atlas_index > 0
+    membership[numpy.flatnonzero(in_atlas), atlas_index[in_atlas] - 1] = 1
+    for bit in range(mask_count):
+        membership[:, len(atlas_labels) + bit] = (parcel_keys >> bit) & 1
+
+    logging.info('fMRI ROIs: %s ROIs over %s voxels in %s parcels', len(names), len(voxels), len(parcel_keys))
+    return RoiParcels(names, voxels[order], parcel_starts, membership)
+
+
+def extract_roi_signals(nifti_path, parcels, progress_callback=None):
+    # one streaming pass over the scans, a block of scans at a time, all ROIs at once
+    volumes = fMRIVolumes.open_volumes(nifti_path)
+    signals = numpy.full((len(parcels), volumes.scan_count), numpy.nan, dtype=numpy.float32)
+    if len(parcels.voxels) == 0:
+        return signals
+
+    block_size = config.FMRI_ROI_BLOCK_SCANS
+    for start in range(0, volumes.scan_count, block_size):
+        end = min(start + block_size, volumes.scan_count)
+        block = numpy.asanyarray(volumes.image.dataobj[..., start:end], dtype=numpy.float32)
+        signals[:, start:end] = parcels.means(block.reshape(-1, end - start))
+
+        if progress_callback is not None and progress_callback(end, volumes.scan_count) is False:
+            return None
+
+    return signals
+
+
+def get_roi_signals(nifti_path, progress_callback=None):
+    # ROI x scan matrix of all configured ROIs, cached per NIfTI file and ROI definition
+    names_key = SessionCache.array_key('roi_names', nifti_path, roi_settings())
+    signals_key = SessionCache.array_key('roi_signals', nifti_path, roi_settings())
+
+    names = SessionCache.load_array(names_key)
+    signals = SessionCache.load_array(signals_key)
+    if names is not None and signals is not None:
+        logging.info('fMRI ROIs: %s ROI signals loaded from the cache', len(names))
+        return [str(name) for name in names], signals
+
+    started = time.perf_counter()
+    parcels = load_parcels(fMRIVolumes.open_volumes(nifti_path).shape)
+    signals = extract_roi_signals(nifti_path, parcels, progress_callback)
+    if signals is None:
+        return None
+
+    logging.info('fMRI ROIs: %s ROI signals extracted in %.2f s', len(parcels), time.perf_counter() - started)
+    SessionCache.store_array(signals_key, signals)
+    SessionCache.store_array(names_key, numpy.array(parcels.names, dtype=str))
+
+    return parcels.names, signals
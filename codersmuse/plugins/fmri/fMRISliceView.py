@@ -0,0 +1,153 @@
+import numpy
+from matplotlib import cm
+from nibabel import affines
+from PySide2 import QtGui, QtWidgets
+from PySide2.QtCore import QPointF, QRectF, Qt
+from PySide2.QtGui import QColor
+
+from codersmuse import config
+
+PANEL_SPACING = 4
+CROSSHAIR_COLOR = QColor(255, 255, 255, 160)
+
+
+def _color_table(colormap):
+    # ARGB lookup table for 256 intensity levels
+    rgba = colormap(numpy.linspace(0, 1, 256), bytes=True).astype(numpy.uint32)
+    return (rgba[:, 3] << 24) | (rgba[:, 0] << 16) | (rgba[:, 1] << 8) | rgba[:, 2]
+
+
+SLICE_COLORS = _color_table(cm.nipy_spectral)
+
+
+class fMRISliceView(QtWidgets.QWidget):
+    """Sagittal, coronal and axial slice of the current scan through a crosshair, read from the volume and colored in numpy for every frame.
+
+    Clicking or dragging in a slice moves the crosshair."""
+
+    def __init__(self, parent=None):
+        super(fMRISliceView, self).__init__(parent)
+
+        self.volumes = None
+        self.scan = None
+        self.cursor = None
+        self.value = None
+        self.slices = []
+        self.dragged_panel = None
+
+        self.setMinimumHeight(config.FMRI_SLICE_VIEW_HEIGHT)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+
+    def set_volumes(self, volumes):
+        if volumes is self.volumes:
+            return
+
+        self.volumes = volumes
+        self.scan = None
+        self.slices = []
+
+        # the configured cut coordinates are world coordinates (as for nilearn), the crosshair starts there
+        voxel = affines.apply_affine(numpy.linalg.inv(volumes.image.affine), (config.FMRI_CUT_SLICE_X, config.FMRI_CUT_SLICE_Y, config.FMRI_CUT_SLICE_Z))
+        self.cursor = tuple(int(min(max(round(coordinate), 0), size - 1)) for coordinate, size in zip(voxel, volumes.shape[:3]))
+
+    def set_scan(self, scan):
+        self.scan = scan if self.volumes is not None and 0 <= scan < self.volumes.scan_count else None
+        self.update_slices()
+
+    def set_cursor(self, x, y, z):
+        shape = self.volumes.shape[:3]
+        cursor = tuple(int(min(max(coordinate, 0), size - 1)) for coordinate, size in zip((x, y, z), shape))
+        if cursor == self.cursor:
+            return
+
+        self.cursor = cursor
+        self.update_slices()
+
+    def update_slices(self):
+        # three slices and one lookup per pixel, no full scan is decoded unless it is cached already
+        self.slices = []
+        self.value = None
+        if self.scan is not None:
+            x, y, z = self.cursor
+            sagittal, coronal, axial = self.volumes.get_slices(self.scan, x, y, z)
+            self.value = sagittal[y, z]
+            self.slices = [self.slice_image(values) for values in (sagittal, coronal, axial)]
+
+        self.update()
+
+    def slice_image(self, values):
+        # first axis left to right, second axis bottom to top
+        low, high = self.volumes.intensity_limits()
+        with numpy.errstate(invalid='ignore'):
+            levels = numpy.clip((values.T[::-1] - low) * (255 / ((high - low) or 1)), 0, 255)
+        pixels = SLICE_COLORS[numpy.nan_to_num(levels).astype(numpy.uint8)]
+
+        # the image uses the lookup result as its buffer, so the array is kept with it
+        height, width = pixels.shape
+        return pixels, QtGui.QImage(pixels.data, width, height, width * 4, QtGui.QImage.Format_ARGB32)
+
+    def panels(self):
+        # target rectangle and (horizontal, vertical) voxel axes of every slice, sized by the voxel dimensions
+        shape = self.volumes.shape[:3]
+        zooms = self.volumes.image.header.get_zooms()[:3]
+        extent = [shape[axis] * zooms[axis] for axis in range(3)]
+
+        axes = ((1, 2), (0, 2), (0, 1))
+        total_width = sum(extent[horizontal] for horizontal, _ in axes)
+        total_height = max(extent[vertical] for _, vertical in axes)
+        scale = min((self.width() - 2 * PANEL_SPACING) / total_width, self.height() / total_height)
+
+        panels = []
+        left = 0
+        for horizontal, vertical in axes:
+            width, height = extent[horizontal] * scale, extent[vertical] * scale
+            panels.append((QRectF(left, (self.height() - height) / 2, width, height), horizontal, vertical))
+            left += width + PANEL_SPACING
+
+        return panels
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        if not self.slices:
+            return
+
+        # nearest neighbour scaling, so voxels stay visible as such
+        painter.setPen(CROSSHAIR_COLOR)
+        for (_, image), (rect, horizontal, vertical) in zip(self.slices, self.panels()):
+            painter.drawImage(rect, image)
+
+            size = self.volumes.shape
+            crosshair_x = rect.left() + (self.cursor[horizontal] + 0.5) * rect.width() / size[horizontal]
+            crosshair_y = rect.bottom() - (self.cursor[vertical] + 0.5) * rect.height() / size[vertical]
+            painter.drawLine(QPointF(crosshair_x, rect.top()), QPointF(crosshair_x, rect.bottom()))
+            painter.drawLine(QPointF(rect.left(), crosshair_y), QPointF(rect.right(), crosshair_y))
+
+        world = affines.apply_affine(self.volumes.image.affine, self.cursor)
+        painter.setPen(Qt.white)
+        painter.drawText(QRectF(4, 2, self.width(), 20), Qt.AlignLeft | Qt.AlignTop,
+                         'Scan %s   x=%.0f y=%.0f z=%.0f   %.2f' % (self.scan, world[0], world[1], world[2], self.value))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.slices:
+            self.dragged_panel = None
+            for index, (rect, _, _) in enumerate(self.panels()):
+                if rect.contains(QPointF(event.pos())):
+                    self.dragged_panel = index
+            self.move_cursor(event.pos())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton and self.slices:
+            self.move_cursor(event.pos())
+
+    def move_cursor(self, position):
+        # the two axes shown in the clicked slice follow the mouse
+        if self.dragged_panel is None:
+            return
+
+        rect, horizontal, vertical = self.panels()[self.dragged_panel]
+        size = self.volumes.shape
+        cursor = list(self.cursor)
+        cursor[horizontal] = int((position.x() - rect.left()) * size[horizontal] // rect.width())
+        cursor[vertical] = int((rect.bottom() - position.y()) * size[vertical] // rect.height())
+        self.set_cursor(*cursor)
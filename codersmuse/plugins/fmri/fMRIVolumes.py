@@ -0,0 +1,66 @@
+import functools
+import logging
+from collections import OrderedDict
+
+import nibabel
+import numpy
+
+from codersmuse import config
+
+
+class fMRIVolumes:
+    """Lazy access to the scans of a 4D NIfTI file. Only requested scans (or slices) are read from the memory-mapped file."""
+
+    def __init__(self, nifti_path, cache_size=config.FMRI_VOLUME_CACHE_SIZE):
+        self.nifti_path = nifti_path
+        self.image = nibabel.load(nifti_path, mmap=True)
+        self.shape = self.image.shape
+        self.scan_count = self.shape[3]
+        self.cache_size = cache_size
+        self.volumes = OrderedDict()
+        self.limits = None
+
+    def get_volume(self, scan):
+        # small LRU of decoded scans, the 4D data itself is never loaded as a whole
+        if scan in self.volumes:
+            self.volumes.move_to_end(scan)
+            return self.volumes[scan]
+
+        volume = numpy.asanyarray(self.image.dataobj[..., scan])
+        logging.debug('fMRI volumes: read scan %s of %s', scan, self.nifti_path)
+
+        self.volumes[scan] = volume
+        if len(self.volumes) > self.cache_size:
+            self.volumes.popitem(last=False)
+
+        return volume
+
+    def get_slices(self, scan, x, y, z):
+        # three orthogonal slices through (x, y, z) in voxel coordinates
+        if scan in self.volumes:
+            volume = self.get_volume(scan)
+            return volume[x, :, :], volume[:, y, :], volume[:, :, z]
+
+        # reading three slices directly touches far less data than decoding the full scan
+        dataobj = self.image.dataobj
+        return (numpy.asanyarray(dataobj[x, :, :, scan]),
+                numpy.asanyarray(dataobj[:, y, :, scan]),
+                numpy.asanyarray(dataobj[:, :, z, scan]))
+
+    def intensity_limits(self):
+        # one color scale for all scans, from the range of a few scans spread over the recording
+        if self.limits is None:
+            volumes = [self.get_volume(scan) for scan in sorted({0, self.scan_count // 2, self.scan_count - 1})]
+            self.limits = (float(min(numpy.nanmin(volume) for volume in volumes)), float(max(numpy.nanmax(volume) for volume in volumes)))
+
+        return self.limits
+
+    def get_image(self, scan):
+        # single scan as a 3D image, e.g., for nilearn plotting
+        return type(self.image)(self.get_volume(scan), self.image.affine, self.image.header)
+
+
+@functools.lru_cache(maxsize=4)
+def open_volumes(nifti_path):
+    # share one accessor per file and process, so its scan cache is reused between calls
+    return fMRIVolumes(nifti_path)
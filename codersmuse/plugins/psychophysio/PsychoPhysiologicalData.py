@@ -1,94 +1,129 @@
 import logging
-import os
 
 import matplotlib
 import matplotlib.pyplot as plt
-import numpy
 
-OVERWRITE_PHYSIO_PLOTS = False
+from codersmuse import config, ConditionSegments, RenderCache, RenderPool, SignalPyramid
 
 width = 6
 height = 3
 dpi = 40
 
-matplotlib.rcParams.update({'font.size': 8})
-
+DATA_TYPES = ['HeartRate', 'Respiration', 'PupilDilation']
 
-def preprocess_psychophysio_data(experiment_data):
-    # split experiment data by condition
-    for i, condition in enumerate(experiment_data['conditions']):
-        condition_dataframe = experiment_data['dataframe'][experiment_data['dataframe']['Condition'] == condition]
+matplotlib.rcParams.update({'font.size': 8})
 
-        # print(condition_dataframe.head(5))
 
-        logging.info('Preprocessing physio data for condition: %s', condition)
+def build_signal_pyramids(experiment_data, progress_callback=None):
+    # envelopes of all physio signals are built once per session, in the background while loading
+    for i, data_type in enumerate(DATA_TYPES):
+        SignalPyramid.get_pyramid(experiment_data, data_type)
+        if progress_callback is not None and progress_callback(i + 1, len(DATA_TYPES)) is False:
+            return False
 
-        # TODO check whether files already exist and whether to overwrite them
-        if not OVERWRITE_PHYSIO_PLOTS:
-            logging.info('--> use preprocessed files')
-            continue
+    return True
 
-        # cycle through all physio data types
-        condition_start_pos = condition_dataframe['Time'].iloc[0]
-        condition_end_pos = condition_dataframe['Time'].iloc[-1]
-        condition_dataframe.reset_index(inplace=True, drop=True)
 
-        draw_psychophysio_data(experiment_data, 'HeartRate', condition_start_pos, condition_end_pos)
-        draw_psychophysio_data(experiment_data, 'Respiration', condition_start_pos, condition_end_pos, span=600)
-        draw_psychophysio_data(experiment_data, 'PupilDilation', condition_start_pos, condition_end_pos)
+def preprocess_psychophysio_data(experiment_data, progress_callback=None):
+    # live physio plots do not need preprocessed images
+    if config.PHYSIO_PLOT_MODE == 'live':
+        return True
 
-        # todo change code in other places to use preprocessed pngs
+    # split experiment data by condition
+    frames = {data_type: {} for data_type in DATA_TYPES}
+    jobs = []
+    for i, condition in enumerate(experiment_data['conditions']):
+        logging.info('Preprocessing physio data for condition: %s', condition)
 
+        # cycle through all physio data types
+        condition_start_pos, condition_end_pos = ConditionSegments.get_condition_times(experiment_data, condition)
 
-def draw_psychophysio_data(experiment_data, data_type, start_pos, end_pos, span=1200, highlight_span=50, full_plot=False):
-    physio_data = experiment_data['dataframe'][data_type]
+        jobs.extend(draw_psychophysio_data(experiment_data, 'HeartRate', condition_start_pos, condition_end_pos, frames['HeartRate']))
+        jobs.extend(draw_psychophysio_data(experiment_data, 'Respiration', condition_start_pos, condition_end_pos, frames['Respiration'], span=600))
+        jobs.extend(draw_psychophysio_data(experiment_data, 'PupilDilation', condition_start_pos, condition_end_pos, frames['PupilDilation']))
 
-    plt.figure(figsize=(width, height), dpi=dpi)
+    experiment_data['render_frames'].update(frames)
 
-    for i in range(end_pos - start_pos):
-        if i % 100 != 0:
-            continue
+    logging.info('rendering %s physio plots', len(jobs))
+    completed = RenderPool.render_all(render_psychophysio_frame, jobs, progress_callback)
+    RenderCache.evict()
+    RenderCache.log_statistics()
 
-        # draw one plot per second for each frame within one condition
-        plt.clf()
+    return completed
 
-        current_time = i
 
-        y_values_mask = numpy.isfinite(physio_data)
-        x_axis = numpy.arange(0, len(physio_data), 1)
+def draw_psychophysio_data(experiment_data, data_type, start_pos, end_pos, frames, span=1200, highlight_span=50):
+    # collect one render job per second within one condition, unless the same plot is cached already
+    signal = SignalPyramid.get_pyramid(experiment_data, data_type)
 
-        minimum = start_pos + current_time - span
+    jobs = []
+    for current_time in range(0, end_pos - start_pos, 100):
+        minimum = max(start_pos + current_time - span, 0)
         maximum = start_pos + current_time + span
-        if minimum < 0:
-            minimum = 0
-
-        plot_y_values = physio_data[minimum:maximum]
-        y_values_mask = numpy.isfinite(plot_y_values)
-
-        if len(plot_y_values) < (maximum - minimum):
-            maximum = len(plot_y_values) + minimum
-
-        x_axis = numpy.arange(minimum, maximum, 1)
-
-        plt.plot(x_axis[y_values_mask], plot_y_values[y_values_mask])
-
-        # todo add horizontal line for average condition and/or average of entire session
-
-        # add backgrounds for condition visualization
-        task_start = minimum
-        if start_pos > minimum:
-            task_start = start_pos
-
-        task_end = maximum
-        if maximum > end_pos:
-            task_end = end_pos
-
-        plt.axvspan(task_start, task_end, color='blue', alpha=0.05)
-
-        # highlight current time
-        plt.axvspan(start_pos + current_time - highlight_span, start_pos + current_time + highlight_span, color='red', alpha=0.2)
-        plt.gca().set_ylim(min(physio_data), max(physio_data))
 
-        # save plot as pngs
-        file_name = experiment_data['participant'] + '_' + data_type + '_' + str(current_time) + '.png'
-        plt.savefig(os.path.join('temp', 'physio', file_name), bbox_inches='tight')
+        # at most one min/max pair per pixel of the plot image, from the samples at their native rate
+        first, last = signal.sample_range(minimum, maximum)
+        x_axis, y_values = signal.envelope_line(first, last, width * dpi)
+        x_axis = signal.sample_times(x_axis)
+
+        key = RenderCache.render_key(
+            data_type,
+            x_axis=x_axis,
+            y_values=y_values,
+            minimum=minimum,
+            maximum=maximum,
+            y_limits=signal.limits,
+            start_pos=start_pos,
+            end_pos=end_pos,
+            current_time=current_time,
+            highlight_span=highlight_span,
+            size=(width, height, dpi))
+        frames[(start_pos, current_time)] = RenderCache.lookup(key)
+
+        if frames[(start_pos, current_time)] is None:
+            frames[(start_pos, current_time)] = RenderCache.cache_path(key)
+            jobs.append({
+                'x_axis': x_axis,
+                'y_values': y_values,
+                'minimum': minimum,
+                'maximum': maximum,
+                'y_limits': signal.limits,
+                'start_pos': start_pos,
+                'end_pos': end_pos,
+                'current_time': current_time,
+                'output_file': frames[(start_pos, current_time)],
+                'highlight_span': highlight_span
+            })
+
+    return jobs
+
+
+def render_psychophysio_frame(x_axis, y_values, minimum, maximum, y_limits, start_pos, end_pos, current_time, output_file, highlight_span):
+    # draw one plot for one second of a condition, runs in a worker process
+    plt.switch_backend('Agg')
+    figure = plt.figure(figsize=(width, height), dpi=dpi)
+
+    # non-finite values just leave a gap in the line
+    plt.plot(x_axis, y_values)
+
+    # todo add horizontal line for average condition and/or average of entire session
+
+    # add backgrounds for condition visualization
+    task_start = minimum
+    if start_pos > minimum:
+        task_start = start_pos
+
+    task_end = maximum
+    if maximum > end_pos:
+        task_end = end_pos
+
+    plt.axvspan(task_start, task_end, color='blue', alpha=0.05)
+
+    # highlight current time
+    plt.axvspan(start_pos + current_time - highlight_span, start_pos + current_time + highlight_span, color='red', alpha=0.2)
+    if y_limits is not None:
+        plt.gca().set_ylim(*y_limits)
+
+    # save plot as pngs
+    RenderPool.save_figure_atomic(figure, output_file, bbox_inches='tight')
+    plt.close(figure)
@@ -1,7 +1,11 @@
 import matplotlib
-import numpy
+import matplotlib.figure
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import blended_transform_factory
+
+from codersmuse import config
 
 
 class MyMplCanvas(FigureCanvas):
@@ -26,64 +30,120 @@ class MyMplCanvas(FigureCanvas):
 
 
 class PhysiologicalPlot(MyMplCanvas):
-    """Simple canvas with a sine plot."""
+    """Live plot of one signal around the current time. Artists are created once, updates only redraw them (blitting)."""
 
     def __init__(self, parent=None, width=5, height=4, dpi=100):
         super().__init__(parent, width, height, dpi)
-        self.aspan = None
-        self.plot = None
-        self.all_y_values = None
+        self.axes = self.fig.add_subplot(111)
+        self.background = None
+        self.signal = None
+        self.start_pos = 0
+        self.end_pos = 0
+        self.current_time = 0
+        self.span = 1200
+        self.highlight_span = 50
+        self.full_plot = False
+
+        # spans are positioned in data coordinates horizontally, but always cover the full height
+        span_transform = blended_transform_factory(self.axes.transData, self.axes.transAxes)
+        self.condition_span = Rectangle((0, 0), 0, 1, transform=span_transform, color='blue', alpha=0.05, animated=True)
+        self.aspan = Rectangle((0, 0), 0, 1, transform=span_transform, color='red', alpha=0.2, animated=True)
+        self.axes.add_patch(self.condition_span)
+        self.axes.add_patch(self.aspan)
+        self.plot, = self.axes.plot([], [], animated=True)
+
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def set_signal(self, signal, start_pos, end_pos, span=1200, highlight_span=50, full_plot=False):
+        # signal is a SignalPyramid, its precomputed limits are used for the y axis
+        limits = (self.axes.get_xlim(), self.axes.get_ylim())
+
+        if self.signal is None or signal is not self.signal:
+            self.signal = signal
+            if signal.limits is not None:
+                self.axes.set_ylim(*signal.limits)
 
-    def set_y_values(self, y_values, start_pos, end_pos):
-        self.all_y_values = y_values
         self.start_pos = start_pos
         self.end_pos = end_pos
-        self.update_plot()
-
-    def update_plot(self, current_time=0, span=1200, highlight_span=50, full_plot=False):
-        self.figure.clf()
-        ax1 = self.figure.add_subplot(111)
+        self.span = span
+        self.highlight_span = highlight_span
+        self.full_plot = full_plot
+        self.current_time = 0
 
+        # x axis is in seconds, relative to the current time (or the session start for the full plot)
         if full_plot:
-            self.draw_full_plot(ax1)
+            self.axes.set_xlim(0, (signal.times[-1] if len(signal.times) > 0 else 0) / config.DATA_RESOLUTION)
         else:
-            minimum = self.start_pos + current_time - span
-            maximum = self.start_pos + current_time + span
-            if minimum < 0:
-                minimum = 0
+            self.axes.set_xlim(-span / config.DATA_RESOLUTION, span / config.DATA_RESOLUTION)
+
+        # the background only shows the axes, a full draw (which triggers on_draw to store the new background)
+        # is only necessary if their limits changed, e.g., for another participant
+        if self.background is None or limits != (self.axes.get_xlim(), self.axes.get_ylim()):
+            self.draw()
+        else:
+            self.update_plot(0)
+
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        self.draw_animated()
 
-            plot_y_values = self.all_y_values[minimum:maximum]
-            y_values_mask = numpy.isfinite(plot_y_values)
+    def update_plot(self, current_time=0):
+        self.current_time = current_time
+        if self.background is None or self.signal is None:
+            return
+
+        self.restore_region(self.background)
+        self.draw_animated()
+        self.blit(self.axes.bbox)
+
+    def draw_animated(self):
+        if self.signal is None:
+            return
+
+        if self.full_plot:
+            self.draw_full_plot()
+        else:
+            self.draw_window()
 
-            if len(plot_y_values) < (maximum - minimum):
-                maximum = len(plot_y_values) + minimum
+        self.axes.draw_artist(self.condition_span)
+        self.axes.draw_artist(self.plot)
+        self.axes.draw_artist(self.aspan)
 
-            x_axis = numpy.arange(minimum, maximum, 1)
+    def draw_window(self):
+        position = self.start_pos + self.current_time
 
-            self.plot = ax1.plot(x_axis[y_values_mask], plot_y_values[y_values_mask])
+        minimum = max(position - self.span, 0)
+        maximum = position + self.span
 
-            # todo evaluate adding a horizontal line for average condition and/or average of entire session
+        # samples at their native rate, at most one min/max pair per pixel, non-finite values just leave a gap in the line
+        first, last = self.signal.sample_range(minimum, maximum)
+        x_axis, y_values = self.signal.envelope_line(first, last, self.pixel_width())
+        self.plot.set_data((self.signal.sample_times(x_axis) - position) / config.DATA_RESOLUTION, y_values)
 
-            # add backgrounds for condition visualization
-            task_start = minimum
-            if self.start_pos > minimum:
-                task_start = self.start_pos
+        # todo evaluate adding a horizontal line for average condition and/or average of entire session
 
-            task_end = maximum
-            if maximum > self.end_pos:
-                task_end = self.end_pos
+        # add backgrounds for condition visualization
+        task_start = max(self.start_pos, minimum)
+        task_end = min(self.end_pos, maximum)
+        self.set_span(self.condition_span, (task_start - position) / config.DATA_RESOLUTION, (task_end - position) / config.DATA_RESOLUTION)
 
-            self.aspan = ax1.axvspan(task_start, task_end, color='blue', alpha=0.05)
+        # highlight current time
+        self.set_span(self.aspan, -self.highlight_span / config.DATA_RESOLUTION, self.highlight_span / config.DATA_RESOLUTION)
 
-            # highlight current time
-            self.aspan = ax1.axvspan(self.start_pos + current_time - highlight_span, self.start_pos + current_time + highlight_span, color='red', alpha=0.2)
+    def draw_full_plot(self):
+        position = self.start_pos + self.current_time
 
-        ax1.set_ylim(min(self.all_y_values), max(self.all_y_values))
+        # the drawing cost depends on the plot width, not on the length of the session
+        x_axis, y_values = self.signal.envelope_line(0, len(self.signal.values), self.pixel_width())
+        self.plot.set_data(self.signal.sample_times(x_axis) / config.DATA_RESOLUTION, y_values)
 
-        self.fig.canvas.draw_idle()
+        self.set_span(self.condition_span, self.start_pos / config.DATA_RESOLUTION, self.end_pos / config.DATA_RESOLUTION)
+        self.set_span(self.aspan, (position - self.highlight_span) / config.DATA_RESOLUTION, (position + self.highlight_span) / config.DATA_RESOLUTION)
 
-    def draw_full_plot(self, ax1):
-        y_values_mask = numpy.isfinite(self.all_y_values)
-        x_axis = numpy.arange(0, len(self.all_y_values), 1)
-        self.plot = ax1.plot(x_axis[y_values_mask], self.all_y_values[y_values_mask])
+    def pixel_width(self):
+        return max(int(self.axes.bbox.width), 1)
 
+    @staticmethod
+    def set_span(span, start, end):
+        span.set_x(start)
+        span.set_width(max(end - start, 0))
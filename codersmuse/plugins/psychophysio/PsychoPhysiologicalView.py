@@ -1,39 +1,67 @@
-import os
-
 from PySide2 import QtGui
 from PySide2.QtWidgets import QLabel
 
+from codersmuse import config, ImageCache, SignalPyramid
+from codersmuse.plugins.psychophysio import PsychoPhysiologicalData
+from codersmuse.plugins.psychophysio.PsychoPhysiologicalPlot import PhysiologicalPlot
+
 
 class PsychoPhysiologicalView:
     def __init__(self, data_type):
         self.data_type = data_type
         self.participant = None
+        self.signal = None
+        self.stream = None
+        self.frames = {}
+        self.condition_start_pos = None
+        self.span = 1200
 
         if data_type == 'HeartRate':
             self.data_type_readable = 'Heart Rate'
         elif data_type == 'Respiration':
             self.data_type_readable = 'Respiration'
+            self.span = 600
         elif data_type == 'PupilDilation':
             self.data_type_readable = 'Pupil Dilation'
 
         self.title = QLabel(self.data_type_readable)
-        self.plot = QLabel()
+
+        if config.PHYSIO_PLOT_MODE == 'live':
+            self.plot = PhysiologicalPlot(width=PsychoPhysiologicalData.width, height=PsychoPhysiologicalData.height, dpi=PsychoPhysiologicalData.dpi)
+        else:
+            self.plot = QLabel()
 
     def create_view(self, label_layout, plot_layout, participant):
         self.participant = participant
         self.title.setFont(QtGui.QFont("Times", 14, QtGui.QFont.Normal))
         label_layout.addWidget(self.title)
 
-        path = os.path.join('temp', 'physio', participant + '_' + self.data_type + '_0.png')
-        self.plot.setPixmap(QtGui.QPixmap(path))
         self.plot.show()
 
         plot_layout.addWidget(self.plot)
 
-    def update_text(self, value):
+    def set_condition(self, experiment_data, condition_start_pos, condition_end_pos):
+        self.stream = experiment_data['streams']['physio']
+
+        if config.PHYSIO_PLOT_MODE == 'live':
+            # built once per participant, so the plot can keep its y axis limits when switching conditions
+            self.signal = SignalPyramid.get_pyramid(experiment_data, self.data_type)
+            self.plot.set_signal(self.signal, condition_start_pos, condition_end_pos, span=self.span)
+        else:
+            self.frames = experiment_data['render_frames'].get(self.data_type, {})
+            self.condition_start_pos = condition_start_pos
+
+    def update_text(self, time):
+        value = self.stream.value_at([time], self.data_type, interpolate=config.ALIGNMENT_INTERPOLATE)[0]
         self.title.setText(self.data_type_readable + ': ' + str(value).zfill(4))
 
     def update_plot(self, time):
-        path = os.path.join('temp', 'physio', self.participant + '_' + self.data_type + '_' + str(int(round(time, -2))) + '.png')
-        self.plot.setPixmap(QtGui.QPixmap(path))
+        if config.PHYSIO_PLOT_MODE == 'live':
+            self.plot.update_plot(time)
+            return
+
+        frame = int(round(time, -2))
+        image_cache = ImageCache.get_image_cache()
+        self.plot.setPixmap(image_cache.get_pixmap(self.frames.get((self.condition_start_pos, frame))))
+        image_cache.prefetch(self.frames.get((self.condition_start_pos, frame + i * 100)) for i in range(1, config.IMAGE_PREFETCH_FRAMES + 1))
         self.plot.show()
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from codersmuse import ConditionSegments
+
+CONDITIONS = ['a', 'a', 'b', 'b', 'b', 'a', 'c']
+
+
+def experiment_data(categorical):
+    conditions = pd.Categorical(CONDITIONS) if categorical else CONDITIONS
+    dataframe = pd.DataFrame({'Time': range(10, 10 + len(CONDITIONS)), 'Condition': conditions})
+    return {'dataframe': dataframe, 'segments': ConditionSegments.build_segment_index(dataframe)}
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_segment_index(categorical):
+    segments = experiment_data(categorical)['segments']
+
+    assert [(segment['start_row'], segment['end_row']) for segment in segments['a']] == [(0, 2), (5, 6)]
+    assert [(segment['start_row'], segment['end_row']) for segment in segments['b']] == [(2, 5)]
+    assert [(segment['start_row'], segment['end_row']) for segment in segments['c']] == [(6, 7)]
+    assert (segments['a'][1]['start_time'], segments['a'][1]['end_time']) == (15, 15)
+    assert (segments['b'][0]['start_time'], segments['b'][0]['end_time']) == (12, 14)
+
+
+def test_empty_dataframe_has_no_segments():
+    assert ConditionSegments.build_segment_index(pd.DataFrame({'Time': [], 'Condition': []})) == {}
+
+
+def test_condition_dataframe_joins_all_segments():
+    data = experiment_data(False)
+    condition_dataframe = ConditionSegments.get_condition_dataframe(data, 'a')
+
+    assert condition_dataframe['Time'].tolist() == [10, 11, 15]
+    assert condition_dataframe.index.tolist() == [0, 1, 2]
+    assert ConditionSegments.get_condition_times(data, 'a') == (10, 15)
+
+
+def test_find_condition_time_and_get_session_row_are_inverse():
+    data = experiment_data(False)
+
+    expected = [('a', 0), ('a', 1), ('b', 0), ('b', 1), ('b', 2), ('a', 2), ('c', 0)]
+    for row, (condition, time) in enumerate(expected):
+        assert ConditionSegments.find_condition_time(data, row) == (condition, time)
+        assert ConditionSegments.get_session_row(data, condition, time) == row
+
+    assert ConditionSegments.find_condition_time(data, len(CONDITIONS)) == (None, 0)
+    # times beyond the end of a condition stay on its last row
+    assert ConditionSegments.get_session_row(data, 'a', 10) == 5
@@ -0,0 +1,100 @@
+import numpy
+import pytest
+
+from codersmuse import config
+from codersmuse.plugins.eyetracking import FixationDetection
+
+
+def random_gaze(random, length, missing=0.1):
+    # a few clusters of points, so both fixations and saccades occur, with missing samples
+    centers = random.uniform(0, 300, size=(length // 10 + 1, 2))
+    gaze = centers[numpy.arange(length) // 10] + random.normal(0, 5, size=(length, 2))
+    gaze[random.random(length) < missing] = numpy.nan
+    return gaze[:, 0], gaze[:, 1]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_sliding_maximum_matches_brute_force(seed):
+    random = numpy.random.default_rng(seed)
+    values = random.normal(size=random.integers(1, 60))
+    values[random.random(len(values)) < 0.1] = numpy.nan
+
+    for window in range(1, len(values) + 1):
+        expected = [numpy.max(values[i:i + window]) for i in range(len(values) - window + 1)]
+        numpy.testing.assert_array_equal(FixationDetection.sliding_maximum(values, window), expected)
+        expected = [numpy.min(values[i:i + window]) for i in range(len(values) - window + 1)]
+        numpy.testing.assert_array_equal(FixationDetection.sliding_minimum(values, window), expected)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('window', [1, 3, 8])
+def test_dispersion_threshold_matches_brute_force(seed, window):
+    random = numpy.random.default_rng(seed)
+    length = int(random.integers(1, 120))
+    times = numpy.arange(length, dtype=float)
+    gaze_x, gaze_y = random_gaze(random, length)
+
+    # one sample per Time unit, so the minimum duration covers exactly window samples
+    min_duration = window * 1000 / config.DATA_RESOLUTION
+    covered = FixationDetection.dispersion_threshold_samples(times, gaze_x, gaze_y, 20, min_duration)
+
+    expected = numpy.zeros(length, dtype=bool)
+    for start in range(length - window + 1):
+        x, y = gaze_x[start:start + window], gaze_y[start:start + window]
+        if numpy.all(numpy.isfinite(x)) and numpy.all(numpy.isfinite(y)) and (x.max() - x.min()) + (y.max() - y.min()) <= 20:
+            expected[start:start + window] = True
+
+    numpy.testing.assert_array_equal(covered, expected)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_fixation_events_match_brute_force(seed):
+    random = numpy.random.default_rng(seed)
+    length = int(random.integers(2, 200))
+    times = numpy.arange(length) * 2.0
+    gaze_x, gaze_y = random_gaze(random, length)
+    fixation_samples = random.random(length) < 0.7
+
+    events = FixationDetection.fixation_events(times, gaze_x, gaze_y, fixation_samples)
+
+    # runs of fixation samples with a valid gaze point
+    expected = []
+    run = []
+    for i in range(length + 1):
+        if i < length and fixation_samples[i] and numpy.isfinite(gaze_x[i]) and numpy.isfinite(gaze_y[i]):
+            run.append(i)
+        elif run:
+            expected.append((times[run[0]], times[run[-1]] + 2.0, numpy.mean(gaze_x[run]), numpy.mean(gaze_y[run])))
+            run = []
+
+    assert len(events) == len(expected)
+    for event, (start, end, x, y) in zip(events, expected):
+        assert (event['start'], event['end']) == (start, end)
+        assert event['x'] == pytest.approx(x, rel=1e-5)
+        assert event['y'] == pytest.approx(y, rel=1e-5)
+        assert event['duration'] == pytest.approx((end - start) * 1000 / config.DATA_RESOLUTION)
+
+
+def test_fixation_index_maps_times_to_events():
+    events = numpy.zeros(2, dtype=FixationDetection.FIXATION_DTYPE)
+    events['start'] = [2, 10]
+    events['end'] = [5, 12]
+
+    index = FixationDetection.fixation_index(events, [0, 2, 4.9, 5, 9, 10, 11.5, 12, 20])
+    numpy.testing.assert_array_equal(index, [-1, 0, 0, -1, -1, 1, 1, -1, -1])
+
+
+@pytest.mark.parametrize('method', ['ivt', 'idt', 'gaze'])
+def test_detect_fixations_finds_two_fixations(method):
+    # 100 Hz: 300 ms at one point, a 20 ms saccade, 300 ms at another point
+    times = numpy.arange(62, dtype=float)
+    gaze_x = numpy.concatenate((numpy.full(30, 100.0), [300.0, 500.0], numpy.full(30, 700.0)))
+    gaze_y = numpy.full(62, 200.0)
+    gaze = numpy.concatenate((numpy.ones(30), [0, 0], numpy.ones(30)))
+
+    events = FixationDetection.detect_fixations(times, gaze_x, gaze_y, method, gaze)
+
+    assert len(events) == 2
+    numpy.testing.assert_array_equal(events['x'], [100, 700])
+    numpy.testing.assert_array_equal(events['y'], [200, 200])
+    assert events['start'][0] == 0 and events['end'][1] == 62
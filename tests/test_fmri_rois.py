@@ -0,0 +1,71 @@
+import nibabel
+import numpy
+import pytest
+
+from codersmuse import config
+from codersmuse.plugins.fmri import fMRIRois
+
+SHAPE = (6, 7, 5, 9)
+
+
+@pytest.fixture
+def roi_files(tmp_path, monkeypatch):
+    # an atlas with three labels (one of them named) and two masks that overlap the atlas and each other
+    random = numpy.random.default_rng(0)
+    affine = numpy.eye(4)
+
+    scans = random.normal(100, 10, size=SHAPE).astype(numpy.float32)
+    scans[random.random(SHAPE) < 0.05] = numpy.nan
+    nifti_path = str(tmp_path / 'scans.nii')
+    nibabel.save(nibabel.Nifti1Image(scans, affine), nifti_path)
+
+    atlas = random.choice([0, 3, 5, 9], size=SHAPE[:3]).astype(numpy.int16)
+    nibabel.save(nibabel.Nifti1Image(atlas, affine), str(tmp_path / 'atlas.nii.gz'))
+    (tmp_path / 'atlas.csv').write_text('Label,Name\n5,BA6\n')
+
+    masks = {}
+    for name, selection in (('front', numpy.s_[:3]), ('middle', numpy.s_[2:5])):
+        mask = numpy.zeros(SHAPE[:3], dtype=numpy.uint8)
+        mask[selection] = 1
+        nibabel.save(nibabel.Nifti1Image(mask, affine), str(tmp_path / (name + '.nii')))
+        masks[name] = mask > 0
+
+    monkeypatch.setattr(config, 'FMRI_ROI_ATLAS', str(tmp_path / 'atlas.nii.gz'))
+    monkeypatch.setattr(config, 'FMRI_ROI_MASKS', {name: str(tmp_path / (name + '.nii')) for name in masks})
+    monkeypatch.setattr(config, 'FMRI_ROI_BLOCK_SCANS', 4)
+
+    roi_masks = [atlas == label for label in (3, 5, 9)] + list(masks.values())
+    return nifti_path, scans, roi_masks
+
+
+def test_roi_names(roi_files):
+    parcels = fMRIRois.load_parcels(SHAPE)
+
+    assert parcels.names == ['label 3', 'BA6', 'label 9', 'front', 'middle']
+
+
+def test_means_match_every_mask(roi_files):
+    nifti_path, scans, roi_masks = roi_files
+    parcels = fMRIRois.load_parcels(SHAPE)
+
+    means = parcels.means(scans.reshape(-1, SHAPE[3]))
+
+    expected = [[numpy.nanmean(scans[..., scan][mask]) for scan in range(SHAPE[3])] for mask in roi_masks]
+    numpy.testing.assert_allclose(means, expected, rtol=1e-6)
+
+
+def test_extraction_streams_blocks_of_scans(roi_files):
+    nifti_path, scans, roi_masks = roi_files
+    parcels = fMRIRois.load_parcels(SHAPE)
+
+    signals = fMRIRois.extract_roi_signals(nifti_path, parcels)
+
+    expected = [[numpy.nanmean(scans[..., scan][mask]) for scan in range(SHAPE[3])] for mask in roi_masks]
+    assert signals.shape == (len(roi_masks), SHAPE[3])
+    numpy.testing.assert_allclose(signals, expected, rtol=1e-6)
+
+
+def test_extraction_can_be_cancelled(roi_files):
+    nifti_path, scans, roi_masks = roi_files
+
+    assert fMRIRois.extract_roi_signals(nifti_path, fMRIRois.load_parcels(SHAPE), lambda done, total: False) is None
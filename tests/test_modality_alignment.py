@@ -0,0 +1,66 @@
+import numpy
+import pandas as pd
+
+from codersmuse import ModalityAlignment
+
+
+def make_stream():
+    # 50 Hz samples (Time in hundredths of a second), unsorted, with a gap between 6 and 20
+    times = numpy.array([4.0, 0.0, 2.0, 6.0, 20.0, 22.0])
+    columns = {
+        'Value': numpy.array([40.0, 0.0, 20.0, 60.0, 200.0, 220.0]),
+        'Gaze': numpy.array([1, 0, 1, 0, 1, 1])
+    }
+    return ModalityAlignment.ModalityStream(times, columns, hold_columns=['Gaze'])
+
+
+def test_samples_are_sorted_by_time():
+    stream = make_stream()
+
+    numpy.testing.assert_array_equal(stream.times, [0, 2, 4, 6, 20, 22])
+    numpy.testing.assert_array_equal(stream.columns['Value'], [0, 20, 40, 60, 200, 220])
+    assert stream.period == 2
+
+
+def test_value_at_holds_the_last_sample_within_one_period():
+    stream = make_stream()
+
+    values = stream.value_at([-1, 0, 1, 2, 3.9, 7, 10, 21, 23.9, 24], 'Value')
+    numpy.testing.assert_array_equal(values, [numpy.nan, 0, 0, 20, 20, 60, numpy.nan, 200, 220, numpy.nan])
+
+
+def test_value_at_interpolates_continuous_columns_only():
+    stream = make_stream()
+
+    numpy.testing.assert_array_equal(stream.value_at([1, 5, 21, 23], 'Value', interpolate=True), [10, 50, 210, numpy.nan])
+    numpy.testing.assert_array_equal(stream.value_at([0, 1, 2], 'Gaze', interpolate=True), [0, 0, 1])
+
+
+def test_empty_stream_has_no_values():
+    stream = ModalityAlignment.ModalityStream(numpy.empty(0), {'Value': numpy.empty(0), 'Gaze': numpy.empty(0, dtype=int)}, hold_columns=['Gaze'])
+
+    numpy.testing.assert_array_equal(stream.value_at([0, 5], 'Value'), [numpy.nan, numpy.nan])
+    numpy.testing.assert_array_equal(stream.value_at([0, 5], 'Value', interpolate=True), [numpy.nan, numpy.nan])
+    numpy.testing.assert_array_equal(stream.value_at([1], 'Gaze'), [numpy.nan])
+    assert len(stream.window(0, 10)[0]) == 0
+
+
+def test_window_includes_both_ends():
+    stream = make_stream()
+
+    times, columns = stream.window(2, 20)
+    numpy.testing.assert_array_equal(times, [2, 4, 6, 20])
+    numpy.testing.assert_array_equal(columns['Value'], [20, 40, 60, 200])
+
+    times, columns = stream.window(7, 19)
+    assert len(times) == 0 and len(columns['Gaze']) == 0
+
+
+def test_align_looks_up_every_stream_at_the_timeline():
+    timeline = pd.DataFrame({'Time': [0, 1, 2, 3], 'Condition': ['a'] * 4})
+
+    aligned = ModalityAlignment.align(timeline, [make_stream()], interpolate=True)
+
+    assert list(aligned.columns) == ['Time', 'Condition', 'Value', 'Gaze']
+    numpy.testing.assert_array_equal(aligned['Value'], [0, 10, 20, 30])
+    numpy.testing.assert_array_equal(aligned['Gaze'], [0, 0, 1, 1])
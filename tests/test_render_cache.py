@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from codersmuse import config, RenderCache
+
+
+@pytest.fixture(autouse=True)
+def render_cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'RENDER_CACHE_DIRECTORY', str(tmp_path))
+
+
+def store_image(key, size, mtime):
+    path = RenderCache.cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as image_file:
+        image_file.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_lookup_hits_only_stored_images():
+    path = store_image(RenderCache.render_key('ROI', scan=1), 10, 1000)
+
+    assert RenderCache.lookup(RenderCache.render_key('ROI', scan=1)) == path
+    assert os.stat(path).st_mtime > 1000
+    assert RenderCache.lookup(RenderCache.render_key('ROI', scan=2)) is None
+
+
+def test_evict_removes_least_recently_used_images(monkeypatch):
+    monkeypatch.setattr(config, 'RENDER_CACHE_SIZE', 250)
+    paths = [store_image(RenderCache.render_key('ROI', scan=scan), 100, 1000 + scan) for scan in range(4)]
+
+    # an image another process is still writing
+    temp_path = os.path.splitext(paths[0])[0] + '.tmp1234.png'
+    with open(temp_path, 'wb') as temp_file:
+        temp_file.write(b'x' * 100)
+    os.utime(temp_path, (0, 0))
+
+    RenderCache.evict()
+
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+    assert os.path.exists(temp_path)
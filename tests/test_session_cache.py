@@ -0,0 +1,102 @@
+import numpy
+import pandas as pd
+import pytest
+
+from codersmuse import config, SessionCache
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'CACHE_DIRECTORY', str(tmp_path))
+
+
+def store_chunks(key, chunks):
+    with SessionCache.ColumnStoreWriter(key) as store:
+        for chunk in chunks:
+            store.append(chunk)
+
+    return SessionCache.load_dataframe(key)
+
+
+def test_round_trip_of_all_column_kinds():
+    chunks = [
+        pd.DataFrame({
+            'Time': numpy.array([0, 1, 2], dtype='int32'),
+            'Condition': pd.Categorical(['a', 'a', 'b']),
+            'Stimulus': ['x.png', None, 'y.png'],
+            'Gaze': pd.array([1, pd.NA, 0], dtype='Int8'),
+            'HeartRate': numpy.array([1.5, numpy.nan, 2.5], dtype='float32')
+        }),
+        pd.DataFrame({
+            'Time': numpy.array([3, 4], dtype='int32'),
+            'Condition': pd.Categorical(['c', 'a']),
+            'Stimulus': ['z.png', 'x.png'],
+            'Gaze': pd.array([pd.NA, 1], dtype='Int8'),
+            'HeartRate': numpy.array([3.5, 4.5], dtype='float32')
+        })
+    ]
+
+    loaded, meta = store_chunks('session_test', chunks)
+    expected = pd.concat(chunks, ignore_index=True)
+
+    assert list(loaded.columns) == list(expected.columns)
+    assert isinstance(loaded['Condition'].dtype, pd.CategoricalDtype)
+    assert list(loaded['Condition']) == ['a', 'a', 'b', 'c', 'a']
+    assert list(loaded['Condition'].cat.categories) == ['a', 'b', 'c']
+
+    # text columns are stored as codes, but only categorical columns come back as categoricals
+    assert not isinstance(loaded['Stimulus'].dtype, pd.CategoricalDtype)
+    assert loaded['Stimulus'].isna().tolist() == [False, True, False, False, False]
+    assert loaded['Stimulus'].dropna().tolist() == ['x.png', 'y.png', 'z.png', 'x.png']
+
+    assert str(loaded['Gaze'].dtype) == 'Int8'
+    assert loaded['Gaze'].isna().tolist() == [False, True, False, True, False]
+    assert loaded['Gaze'].dropna().tolist() == [1, 0, 1]
+
+    numpy.testing.assert_array_equal(loaded['HeartRate'].to_numpy(), expected['HeartRate'].to_numpy())
+    assert loaded['HeartRate'].dtype == numpy.float32
+
+    # the regularly spaced time column is not stored, only its range
+    assert meta['ranges']['Time'] == [0, 1, 5, 'int32']
+    numpy.testing.assert_array_equal(loaded['Time'].to_numpy(), numpy.arange(5))
+    assert loaded['Time'].dtype == numpy.int32
+
+
+def test_integer_column_is_promoted_when_a_later_chunk_has_missing_values():
+    chunks = [
+        pd.DataFrame({'Value': numpy.array([1, 2, 3], dtype='int64')}),
+        pd.DataFrame({'Value': numpy.array([4.5, numpy.nan])})
+    ]
+
+    loaded, meta = store_chunks('promoted_test', chunks)
+
+    assert loaded['Value'].dtype == numpy.float64
+    numpy.testing.assert_array_equal(loaded['Value'].to_numpy(), [1, 2, 3, 4.5, numpy.nan])
+    assert 'Value' not in meta['ranges']
+
+
+def test_irregular_integer_column_is_stored():
+    chunks = [
+        pd.DataFrame({'Time': numpy.array([0, 2, 4], dtype='int64')}),
+        pd.DataFrame({'Time': numpy.array([6, 7], dtype='int64')})
+    ]
+
+    loaded, meta = store_chunks('irregular_test', chunks)
+
+    assert 'Time' not in meta['ranges']
+    numpy.testing.assert_array_equal(loaded['Time'].to_numpy(), [0, 2, 4, 6, 7])
+
+
+def test_missing_entry_is_not_loaded():
+    assert SessionCache.load_dataframe('missing') is None
+
+
+def test_session_key_allows_missing_optional_files(tmp_path):
+    behavioral_file = tmp_path / 'p01_behavioral.csv'
+    behavioral_file.write_text('Time,Condition\n0,a\n')
+    physio_file = tmp_path / 'p01_physio.csv'
+
+    key = SessionCache.session_key(str(behavioral_file), str(tmp_path / 'p01_eyetracking.csv'), str(physio_file))
+    physio_file.write_text('Time,HeartRate\n0,60\n')
+
+    assert key != SessionCache.session_key(str(behavioral_file), str(tmp_path / 'p01_eyetracking.csv'), str(physio_file))